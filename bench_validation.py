@@ -0,0 +1,46 @@
+import json
+import timeit
+
+from schemas import (
+    AddMarks, Attendance, CreateClass, FacultyLogin, FacultySignup, GenerateQuiz,
+    QuizAttempt, QuizResponse, StudentChat, StudentLogin, StudentSignup,
+    UploadMaterial, validate_body,
+)
+
+# Sample bodies for every validated route: (route, schema, payload)
+ROUTES = [
+    ('/login/student', StudentLogin, {"usn": "1AB21CS001", "classroom_id": "cs101"}),
+    ('/signup/student', StudentSignup, {"usn": "1AB21CS001", "name": "Asha", "email": "asha@example.com"}),
+    ('/student/chat', StudentChat, {"query": "Explain recursion", "document_id": "doc1"}),
+    ('/signup/faculty', FacultySignup, {"teacher_code": "T100", "name": "Ravi", "email": "ravi@example.com"}),
+    ('/login/faculty', FacultyLogin, {"teacher_code": "T100", "college_name": "ABC College"}),
+    ('/create_class', CreateClass, {"classroom_id": "cs101", "teacher_code": "T100", "college_name": "ABC College", "subject": "DSA"}),
+    ('/faculty/upload-material', UploadMaterial, {"classroom_id": "cs101", "type": "pdf", "url": "https://example.com/a.pdf", "title": "Week 1", "assigned_to": [f"1AB21CS{i:03d}" for i in range(60)]}),
+    ('/attendance/<classroom_id>', Attendance, {"usns": [f"1AB21CS{i:03d}" for i in range(60)]}),
+    ('/faculty/add-marks', AddMarks, {"classroom_id": "cs101", "usn": "1AB21CS001", "marks": {"test1": 85, "assignment1": 90}}),
+    ('/quiz/<classroom_id>/generate', GenerateQuiz, {"topic": "Graphs"}),
+    ('/quiz/<quiz_id>/attempt', QuizAttempt, {"usn": "1AB21CS001", "score": 8}),
+    ('/quiz/response', QuizResponse, {"quiz_id": "q1", "usn": "1AB21CS001", "answered": True}),
+]
+
+
+def old_style(raw, fields):
+    # What the handlers used to do: json.loads + data.get + all([...])
+    data = json.loads(raw)
+    return all([data.get(f) for f in fields])
+
+
+def bench(number=20000):
+    print(f"{'route':32} {'json.loads+get':>16} {'schema':>10} {'overhead':>10}")
+    for route, model, payload in ROUTES:
+        raw = json.dumps(payload).encode()
+        fields = [name for name, field in model.model_fields.items() if field.is_required()]
+        assert validate_body(model, raw)[1] is None, route
+
+        baseline = timeit.timeit(lambda: old_style(raw, fields), number=number) / number * 1e6
+        validated = timeit.timeit(lambda: validate_body(model, raw), number=number) / number * 1e6
+        print(f"{route:32} {baseline:14.2f}us {validated:8.2f}us {validated - baseline:+8.2f}us")
+
+
+if __name__ == '__main__':
+    bench()
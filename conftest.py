@@ -0,0 +1,2 @@
+# test_api.py is the FastAPI app, not a test module
+collect_ignore = ['test_api.py']
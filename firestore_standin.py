@@ -0,0 +1,269 @@
+import copy
+import random
+import threading
+import time
+import uuid
+
+try:
+    from google.api_core.exceptions import AlreadyExists
+except ImportError:
+    AlreadyExists = FileExistsError
+
+# In-memory stand-in for the subset of the Firestore client this app uses,
+# with latency and fault injection per collection. Wrap it in
+# resilience.ResilientClient to exercise deadlines, circuit breaking and stale
+# responses without a real project, e.g.
+#
+#     fake = FakeFirestore()
+#     db = ResilientClient(fake)
+#     fake.inject('classrooms', latency=5)               # slower than the read deadline
+#     fake.inject('*', error=ConnectionError('quota'))   # every collection fails
+#     fake.inject('students', error=ConnectionError('blip'), times=2)  # first two calls fail
+#
+# Like the real client, calls made without `retry=` keep retrying transient
+# failures for `sdk_retry_seconds` regardless of their timeout.
+
+DESCENDING = 'DESCENDING'
+DEFAULT_RETRY = object()  # Stands for the client library's default retry policy
+SDK_RETRY_SECONDS = 60
+
+
+class FakeFirestore:
+    def __init__(self):
+        self._data = {}  # collection path -> {doc_id: dict}
+        self._faults = {}
+        self._lock = threading.Lock()
+        self.sdk_retry_seconds = SDK_RETRY_SECONDS
+        self.calls = 0
+
+    def inject(self, collection='*', latency=0, error=None, rate=1.0, times=None):
+        """Delay calls on `collection` by `latency` seconds and/or raise `error` for a `rate` share of them.
+
+        With `times`, only the next `times` calls are affected.
+        """
+        self._faults[collection] = {"latency": latency, "error": error, "rate": rate, "times": times}
+
+    def clear_faults(self):
+        self._faults.clear()
+
+    def _simulate(self, collection, timeout, retry=DEFAULT_RETRY):
+        started = time.monotonic()
+        while True:
+            try:
+                return self._attempt(collection, timeout)
+            except (TimeoutError, ConnectionError):
+                if retry is not DEFAULT_RETRY or time.monotonic() - started >= self.sdk_retry_seconds:
+                    raise
+                time.sleep(0.01)
+
+    def _attempt(self, collection, timeout):
+        with self._lock:
+            self.calls += 1
+            key = collection if collection in self._faults else '*'
+            fault = self._faults.get(key)
+            if not fault:
+                return
+            if fault['times'] is not None:
+                fault['times'] -= 1
+                if fault['times'] <= 0:
+                    del self._faults[key]
+        if fault['latency']:
+            if timeout is not None and fault['latency'] > timeout:
+                time.sleep(timeout)
+                raise TimeoutError(f"Deadline of {timeout}s exceeded")
+            time.sleep(fault['latency'])
+        if fault['error'] is not None and random.random() < fault['rate']:
+            raise fault['error']
+
+    def collection(self, name):
+        return FakeCollection(self, name, name)
+
+    def document(self, *path):
+        *parents, collection, doc_id = '/'.join(path).split('/')
+        return FakeDocument(self, '/'.join(parents + [collection]), collection, doc_id)
+
+    def get_all(self, references, timeout=None, retry=DEFAULT_RETRY, **kwargs):
+        for collection in dict.fromkeys(reference._collection for reference in references):
+            self._simulate(collection, timeout, retry)
+        for reference in references:
+            yield FakeSnapshot(reference, copy.deepcopy(reference._docs().get(reference.id)))
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+    def get(self, field):
+        if self._data is None or field not in self._data:
+            raise KeyError(field)
+        return copy.deepcopy(self._data[field])
+
+
+class FakeDocument:
+    def __init__(self, client, path, collection, doc_id):
+        self._client = client
+        self._path = path
+        self._collection = collection
+        self.id = doc_id
+
+    @property
+    def path(self):
+        return f"{self._path}/{self.id}"
+
+    def _docs(self):
+        return self._client._data.setdefault(self._path, {})
+
+    def collection(self, name):
+        return FakeCollection(self._client, f"{self._path}/{self.id}/{name}", name)
+
+    def get(self, timeout=None, retry=DEFAULT_RETRY, **kwargs):
+        self._client._simulate(self._collection, timeout, retry)
+        return FakeSnapshot(self, copy.deepcopy(self._docs().get(self.id)))
+
+    def create(self, data, timeout=None, retry=DEFAULT_RETRY, **kwargs):
+        self._client._simulate(self._collection, timeout, retry)
+        self._check_absent()
+        self._write(data, merge=False)
+
+    def set(self, data, merge=False, timeout=None, retry=DEFAULT_RETRY, **kwargs):
+        self._client._simulate(self._collection, timeout, retry)
+        self._write(data, merge)
+
+    def update(self, data, timeout=None, retry=DEFAULT_RETRY, **kwargs):
+        self._client._simulate(self._collection, timeout, retry)
+        self._check_present()
+        self._write(data, merge=True)
+
+    def delete(self, timeout=None, retry=DEFAULT_RETRY, **kwargs):
+        self._client._simulate(self._collection, timeout, retry)
+        self._remove()
+
+    def _check_absent(self):
+        if self.id in self._docs():
+            raise AlreadyExists(f"Document already exists: {self.path}")
+
+    def _check_present(self):
+        if self.id not in self._docs():
+            raise LookupError(f"No document to update: {self.path}")
+
+    def _remove(self):
+        with self._client._lock:
+            self._docs().pop(self.id, None)
+
+    def _write(self, data, merge):
+        with self._client._lock:
+            docs = self._docs()
+            current = docs.get(self.id, {}) if merge else {}
+            docs[self.id] = {**current, **copy.deepcopy(data)}
+
+
+class FakeQuery:
+    def __init__(self, client, path, collection, filters=(), orders=(), limit_to=None):
+        self._client = client
+        self._path = path
+        self._collection = collection
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit_to
+
+    def _derive(self, **changes):
+        state = {"filters": self._filters, "orders": self._orders, "limit_to": self._limit, **changes}
+        return FakeQuery(self._client, self._path, self._collection, **state)
+
+    def where(self, field, op, value):
+        return self._derive(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction='ASCENDING'):
+        return self._derive(orders=self._orders + ((field, direction),))
+
+    def limit(self, count):
+        return self._derive(limit_to=count)
+
+    def _matches(self, data):
+        for field, op, value in self._filters:
+            if field not in data:
+                return False
+            if op == '==' and data[field] != value:
+                return False
+            if op == 'array_contains' and value not in (data[field] or []):
+                return False
+            if op == 'in' and data[field] not in value:
+                return False
+        return True
+
+    def stream(self, timeout=None, retry=DEFAULT_RETRY, **kwargs):
+        self._client._simulate(self._collection, timeout, retry)
+        with self._client._lock:
+            docs = list(self._client._data.get(self._path, {}).items())
+        results = [(doc_id, data) for doc_id, data in docs if self._matches(data)]
+        for field, direction in reversed(self._orders):
+            results = [item for item in results if field in item[1]]
+            results.sort(key=lambda item: item[1][field], reverse=direction == DESCENDING)
+        if self._limit is not None:
+            results = results[:self._limit]
+        for doc_id, data in results:
+            reference = FakeDocument(self._client, self._path, self._collection, doc_id)
+            yield FakeSnapshot(reference, copy.deepcopy(data))
+
+    def get(self, timeout=None, retry=DEFAULT_RETRY, **kwargs):
+        return list(self.stream(timeout=timeout, retry=retry))
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, client, path, collection):
+        super().__init__(client, path, collection)
+        self.id = collection
+
+    def document(self, doc_id=None):
+        return FakeDocument(self._client, self._path, self._collection, doc_id or uuid.uuid4().hex[:20])
+
+    def add(self, data, timeout=None, retry=DEFAULT_RETRY, **kwargs):
+        reference = self.document()
+        reference.set(data, timeout=timeout, retry=retry)
+        return None, reference
+
+
+class FakeBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+        self._creates = []
+        self._updates = []
+
+    def create(self, reference, data):
+        self._creates.append(reference)
+        self._writes.append((reference, lambda: reference._write(data, merge=False)))
+
+    def set(self, reference, data, merge=False):
+        self._writes.append((reference, lambda: reference._write(data, merge)))
+
+    def update(self, reference, data, option=None):
+        self._updates.append(reference)
+        self._writes.append((reference, lambda: reference._write(data, merge=True)))
+
+    def delete(self, reference):
+        self._writes.append((reference, reference._remove))
+
+    def commit(self, timeout=None, retry=DEFAULT_RETRY, **kwargs):
+        # Faults on any collection in the batch fail the whole batch, as a real commit would
+        for collection in dict.fromkeys(reference._collection for reference, _ in self._writes):
+            self._client._simulate(collection, timeout, retry)
+        # An existing create target or a missing update target fails the whole batch before anything is written
+        for reference in self._creates:
+            reference._check_absent()
+        for reference in self._updates:
+            reference._check_present()
+        for _, write in self._writes:
+            write()
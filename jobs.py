@@ -0,0 +1,339 @@
+import datetime
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+
+# In-process background jobs backed by a local SQLite queue.
+#
+# Routes enqueue expensive work (dashboard aggregations, quiz generation,
+# material derivatives) and return immediately; a WorkerPool in every app
+# process claims jobs, retries failures with exponential backoff and stores
+# results in a cache table keyed by the job's `key`. WAL mode plus BEGIN
+# IMMEDIATE claims make it safe for several gunicorn workers to share one
+# database file. Connections and worker threads are created lazily per
+# process, so nothing is inherited across a fork (e.g. `gunicorn --preload`).
+# Workers renew the lease of the job they are running every third of
+# JOB_LEASE_SECONDS; jobs whose worker died are re-claimed once their lease
+# expires, counting as a failed attempt.
+
+JOBS_DB = os.environ.get('JOBS_DB', 'jobs.sqlite3')
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 300))
+JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_SECONDS', 7 * 24 * 3600))
+PRUNE_INTERVAL_SECONDS = 3600
+BACKOFF_BASE_SECONDS = 2
+BACKOFF_MAX_SECONDS = 300
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+_current = threading.local()
+
+
+def job(name):
+    """Register a function as the handler for jobs called `name`."""
+    def register(func):
+        _handlers[name] = func
+        return func
+    return register
+
+
+def current_job():
+    """The job the calling worker thread is running, or None outside a handler."""
+    return getattr(_current, 'job', None)
+
+
+def _json_default(value):
+    # Firestore timestamps come back as datetime subclasses
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _dumps(value):
+    return json.dumps(value, default=_json_default)
+
+
+def backoff(attempts):
+    """Jittered exponential delay before retrying a job that has failed `attempts` times."""
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1)
+
+
+class JobQueue:
+    def __init__(self, path=JOBS_DB, lease_seconds=JOB_LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+
+    def _conn(self):
+        # sqlite3 connections must not be shared across threads or forked
+        # processes, so keep one per thread and reopen after a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    args TEXT NOT NULL,
+                    key TEXT,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    run_after REAL NOT NULL,
+                    lease_until REAL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_after);
+                CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status);
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+            """)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def enqueue(self, name, args=None, key=None, max_attempts=3):
+        """Queue a job and return its id. A queued or running job with the same key is reused."""
+        now = time.time()
+        with self._transaction() as conn:
+            if key is not None:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE key = ? AND status IN ('queued', 'running') LIMIT 1", (key,)
+                ).fetchone()
+                if row:
+                    return row['id']
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, name, args, key, status, max_attempts, run_after, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, name, _dumps(args or {}), key, max_attempts, now, now, now),
+            )
+        return job_id
+
+    def _expire_leases(self, conn, now):
+        # A lapsed lease means the worker died mid-job: count it as a failed attempt
+        expired = conn.execute(
+            "SELECT id, attempts, max_attempts FROM jobs WHERE status = 'running' AND lease_until < ?", (now,)
+        ).fetchall()
+        for row in expired:
+            if row['attempts'] >= row['max_attempts']:
+                status, run_after = 'failed', now
+            else:
+                status, run_after = 'queued', now + backoff(row['attempts'])
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = 'Worker lease expired', run_after = ?, lease_until = NULL,"
+                " updated_at = ? WHERE id = ?",
+                (status, run_after, now, row['id']),
+            )
+
+    def claim(self):
+        """Lease the next runnable job, after requeueing or failing jobs whose lease expired."""
+        now = time.time()
+        with self._transaction() as conn:
+            self._expire_leases(conn, now)
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND run_after <= ? ORDER BY run_after LIMIT 1", (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, updated_at = ?"
+                " WHERE id = ?",
+                (now + self.lease_seconds, now, row['id']),
+            )
+        job = dict(row)
+        job['attempts'] += 1
+        job['args'] = json.loads(job['args'])
+        return job
+
+    def renew(self, job):
+        """Extend the lease of a running job; returns False if this attempt no longer holds it."""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+                (now + self.lease_seconds, now, job['id'], job['attempts']),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job, result):
+        now = time.time()
+        value = _dumps(result)
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_until = NULL, updated_at = ?"
+                " WHERE id = ?",
+                (value, now, job['id']),
+            )
+            if job['key'] is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (key, value, updated_at) VALUES (?, ?, ?)",
+                    (job['key'], value, now),
+                )
+
+    def fail(self, job, error):
+        """Requeue with jittered exponential backoff, or mark failed once attempts run out."""
+        now = time.time()
+        if job['attempts'] >= job['max_attempts']:
+            status, run_after = 'failed', now
+        else:
+            status, run_after = 'queued', now + backoff(job['attempts'])
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, run_after = ?, lease_until = NULL, updated_at = ?"
+                " WHERE id = ?",
+                (status, error, run_after, now, job['id']),
+            )
+
+    def prune(self, older_than=JOB_RETENTION_SECONDS):
+        """Delete finished and failed jobs last updated more than `older_than` seconds ago."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - older_than,),
+            )
+        return cursor.rowcount
+
+    def get(self, job_id):
+        return self._decode(self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def latest(self, key):
+        """Return the most recently queued job for `key`, or None."""
+        return self._decode(self._conn().execute(
+            "SELECT * FROM jobs WHERE key = ? ORDER BY created_at DESC LIMIT 1", (key,)
+        ).fetchone())
+
+    @staticmethod
+    def _decode(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job['args'] = json.loads(job['args'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    def cached(self, key):
+        """Return `(value, updated_at)` for the last successful result stored under `key`, or None."""
+        row = self._conn().execute("SELECT value, updated_at FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row['value']), row['updated_at']
+
+
+class WorkerPool:
+    def __init__(self, queue, concurrency=JOB_WORKERS, poll_interval=0.5):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._last_prune = 0
+
+    def ensure_started(self):
+        """Start the worker threads once per process; safe to call on every request."""
+        if self._pid == os.getpid():
+            return self
+        with self._lock:
+            if self._pid != os.getpid():
+                # Threads do not survive a fork, so a forked child starts its own
+                self._stop = threading.Event()
+                self._threads = []
+                self.start()
+                self._pid = os.getpid()
+        return self
+
+    def start(self):
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if not self._run_once():
+                    self._stop.wait(self.poll_interval)
+            except Exception:
+                # Never let a queue error (e.g. database locked) kill the worker thread
+                logger.exception("Job worker error")
+                self._stop.wait(self.poll_interval)
+
+    def _run_once(self):
+        """Claim and run one job; returns False when there was nothing to do."""
+        job = self.queue.claim()
+        if job is None:
+            self._maybe_prune()
+            return False
+
+        handler = _handlers.get(job['name'])
+        _current.job = job
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, done), name=f"job-heartbeat-{job['id']}",
+                                     daemon=True)
+        heartbeat.start()
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job {job['name']!r}")
+            result = handler(**job['args'])
+            self.queue.complete(job, result)
+        except Exception:
+            logger.exception("Job %s (%s) failed on attempt %s", job['id'], job['name'], job['attempts'])
+            self.queue.fail(job, traceback.format_exc(limit=5))
+        finally:
+            _current.job = None
+            done.set()
+            heartbeat.join()
+        return True
+
+    def _heartbeat(self, job, done):
+        # Keep the lease alive while the handler runs so long jobs are not re-claimed
+        while not done.wait(self.queue.lease_seconds / 3):
+            try:
+                if not self.queue.renew(job):
+                    return
+            except Exception:
+                logger.exception("Could not renew the lease of job %s", job['id'])
+
+    def _maybe_prune(self):
+        with self._lock:
+            if time.time() - self._last_prune < PRUNE_INTERVAL_SECONDS:
+                return
+            self._last_prune = time.time()
+        self.queue.prune()
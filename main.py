@@ -1,16 +1,105 @@
 import os
 import random
-from flask import Flask, jsonify, request
+import re
+import time
+from flask import Flask, jsonify, request, send_file
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 import firebase_admin
 from firebase_admin import credentials, firestore
+from schemas import (
+    AddMarks, Attendance, CreateClass, FacultyLogin, FacultySignup, GenerateQuiz, JsonDocument,
+    QuizAttempt, QuizResponse, StudentChat, StudentLogin, StudentSignup,
+    UploadMaterial, UploadMaterialFile, parse_request, validate_fields,
+)
+from jobs import JobQueue, WorkerPool, current_job, job
+from materials import LocalBlobStore, derivative_key, extract_derivatives, ingest
+from resilience import BackendUnavailable, ResilientClient, StaleCache, serve_stale
+from tenancy import TenantRequired, TenantRouter, tenant_id
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 50)) * 1024 * 1024
 
 cred = credentials.Certificate("serviceAccountKey.json")
 firebase_admin.initialize_app(cred)
-db = firestore.client()
+db = ResilientClient(firestore.client())  # Per-operation deadlines and a circuit breaker per collection
+stale_cache = StaleCache()  # Last good responses of read routes, replayed while Firestore is unhealthy
+router = TenantRouter(db)  # Routes students/teachers/classrooms/attendance per college
+blob_store = LocalBlobStore(os.environ.get('BLOB_STORE_DIR', 'material_blobs'))  # Swap for any materials.BlobStore
+job_queue = JobQueue()  # SQLite connections open lazily, per process and thread
+job_pool = WorkerPool(job_queue)  # Heavy aggregations run here, never on the request thread
+DASHBOARD_TTL_SECONDS = int(os.environ.get('DASHBOARD_TTL_SECONDS', 60))
+# How long a key whose last job failed for good is reported as failing before it is retried
+FAILED_JOB_COOLDOWN_SECONDS = int(os.environ.get('FAILED_JOB_COOLDOWN_SECONDS', 300))
+
+@app.before_request
+def start_job_workers():
+    # Start workers in each process that serves requests (after any gunicorn fork)
+    job_pool.ensure_started()
+
+def request_tenant():
+    # Tenant for routes keyed only by usn/teacher_code; returns (tenant, error_response)
+    tenant = tenant_id(request.args.get('college_name'))
+    if tenant is None and router.requires_tenant:
+        return None, (jsonify({"error": "college_name is required."}), 400)
+    return tenant, None
+
+def classroom_tenant(classroom_id):
+    # Tenant for routes keyed by classroom_id; returns (tenant, error_response)
+    tenant = router.tenant_for_classroom(classroom_id)
+    if tenant is None and router.mode == 'tenant':
+        return None, (jsonify({"error": "Classroom not found."}), 404)
+    return tenant, None
+
+def serve_cached(name, args, key):
+    # Serve the last computed result for `key`, refreshing it in the background when stale
+    cached = job_queue.cached(key)
+    last_job = job_queue.latest(key)
+    cooling_down = 0
+    if last_job is not None and last_job['status'] == 'failed':
+        cooling_down = FAILED_JOB_COOLDOWN_SECONDS - (time.time() - last_job['updated_at'])
+
+    if cached is None:
+        if cooling_down > 0:
+            # Report the failure instead of re-running a job that just used up its retries
+            return jsonify({
+                "error": "Computing this result failed.",
+                "details": last_job['error'],
+                "job_id": last_job['id'],
+                "status_url": f"/jobs/{last_job['id']}"
+            }), 503, {"Retry-After": str(int(cooling_down) + 1)}
+        job_id = job_queue.enqueue(name, args, key=key)
+        return jsonify({
+            "success": True,
+            "message": "Result is being computed.",
+            "job_id": job_id,
+            "status_url": f"/jobs/{job_id}"
+        }), 202
+
+    result, computed_at = cached
+    if time.time() - computed_at > DASHBOARD_TTL_SECONDS and cooling_down <= 0:
+        job_queue.enqueue(name, args, key=key)
+    response = jsonify(result['body'])
+    response.headers['X-Computed-At'] = str(int(computed_at))
+    return response, result['status']
+
+@app.errorhandler(Exception)
+def unexpected_error(e):
+    # Routes let errors propagate; HTTP errors keep their status, anything else is a 500
+    if isinstance(e, HTTPException):
+        return e
+    app.logger.exception("Unhandled error on %s", request.path)
+    return jsonify({"error": str(e)}), 500
+
+@app.errorhandler(BackendUnavailable)
+def backend_unavailable(e):
+    return jsonify({"error": str(e)}), 503, {"Retry-After": "30"}
+
+@app.errorhandler(TenantRequired)
+def tenant_required(e):
+    # Safety net for tenant-mode lookups that reach a retired flat collection
+    return jsonify({"error": "college_name is required."}), 400
 
 @app.route('/')
 def index():
@@ -18,10 +107,12 @@ def index():
 
 @app.route('/users', methods=['POST'])
 def create_user():
-    user_data = request.json
+    user_data, error = parse_request(JsonDocument, "A JSON object body is required.")
+    if error:
+        return error
     users_ref = db.collection('users')
     doc_ref = users_ref.document()
-    doc_ref.set(user_data)
+    doc_ref.set(user_data.model_dump())
     return jsonify({"id": doc_ref.id}), 201
 
 @app.route('/users', methods=['GET'])
@@ -33,10 +124,12 @@ def get_users():
 
 @app.route('/quizzes', methods=['POST'])
 def create_quiz():
-    quiz_data = request.json
+    quiz_data, error = parse_request(JsonDocument, "A JSON object body is required.")
+    if error:
+        return error
     quizzes_ref = db.collection('quizzes')
     doc_ref = quizzes_ref.document()
-    doc_ref.set(quiz_data)
+    doc_ref.set(quiz_data.model_dump())
     return jsonify({"id": doc_ref.id}), 201
 
 @app.route('/quizzes/<quiz_id>', methods=['GET'])
@@ -48,399 +141,400 @@ def get_quiz(quiz_id):
     return jsonify(doc.to_dict()), 200
 @app.route('/login/student', methods=['POST'])
 def student_login():
-    try:
-        data = request.json
-        student_usn = data.get('usn')
-        classroom_id = data.get('classroom_id')
-        
-        if not all([student_usn, classroom_id]):
-            return jsonify({"error": "USN and Classroom ID are required."}), 400
+    data, error = parse_request(StudentLogin, "USN and Classroom ID are required.")
+    if error:
+        return error
+    student_usn = data.usn
+    classroom_id = data.classroom_id
 
        
-        student_ref = db.collection('students').document(student_usn).get()
-        if not student_ref.exists:
-            return jsonify({"error": "Invalid student USN."}), 401
-            
+    tenant, error = classroom_tenant(classroom_id)
+    if error:
+        return error
+    student_ref = router.get('students', student_usn, tenant)
+    if not student_ref.exists:
+        return jsonify({"error": "Invalid student USN."}), 401
         
-        classroom_ref = db.collection('classrooms').document(classroom_id).get()
-        if not classroom_ref.exists or not classroom_ref.get('is_active'):
-            return jsonify({"error": "Classroom not found or is not active."}), 404
-        
-        return jsonify({"success": True, "message": "Student logged in successfully!"}), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    
+    classroom_ref = router.get('classrooms', classroom_id, tenant)
+    if not classroom_ref.exists or not classroom_ref.get('is_active'):
+        return jsonify({"error": "Classroom not found or is not active."}), 404
+    
+    return jsonify({"success": True, "message": "Student logged in successfully!"}), 200
 @app.route('/signup/student', methods=['POST'])
 def student_signup():
-    try:
-        data = request.json
-        usn = data.get('usn')
-        name = data.get('name')
-        email = data.get('email')
-        
-        if not all([usn, name, email]):
-            return jsonify({"error": "USN, name, and email are required for signup."}), 400
-
-        student_ref = db.collection('students').document(usn)
-        if student_ref.get().exists:
-            return jsonify({"error": "Student with this USN already exists."}), 409
-
-        student_ref.set({
-            "name": name,
-            "email": email,
-            "usn": usn,
-            "created_at": firestore.SERVER_TIMESTAMP
-        })
-        
-        return jsonify({"success": True, "message": "Student profile created successfully!"}), 201
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    data, error = parse_request(StudentSignup, "USN, name, and email are required for signup.")
+    if error:
+        return error
+    usn = data.usn
+    name = data.name
+    email = data.email
+
+    tenant = tenant_id(data.college_name)
+    if tenant is None and router.requires_tenant:
+        return jsonify({"error": "College name is required for signup."}), 400
+    if router.get('students', usn, tenant).exists:
+        return jsonify({"error": "Student with this USN already exists."}), 409
+
+    student_ref = router.document('students', usn, tenant)
+    student_ref.set({
+        "name": name,
+        "email": email,
+        "usn": usn,
+        "college_name": data.college_name,
+        "created_at": firestore.SERVER_TIMESTAMP
+    })
+    
+    return jsonify({"success": True, "message": "Student profile created successfully!"}), 201
 
 @app.route('/student/profile/<usn>', methods=['GET'])
+@serve_stale(stale_cache)
 def get_student_profile(usn):
-    try:
-        student_ref = db.collection('students').document(usn)
-        doc = student_ref.get()
-        
-        if not doc.exists:
-            return jsonify({"error": "Student profile not found."}), 404
-        
-        # Get base student data
-        student_data = doc.to_dict()
-        
-        # Get attendance details
-        attendance_ref = db.collection('attendance')
-        attendance_docs = attendance_ref.where('usn', '==', usn).stream()
-        attendance_data = []
-        total_classes = 0
-        classes_attended = 0
-        
-        for attendance in attendance_docs:
-            att_data = attendance.to_dict()
-            attendance_data.append(att_data)
-            total_classes += 1
-            if att_data.get('present', False):
-                classes_attended += 1
-        
-        # Calculate attendance percentage
-        attendance_percentage = (classes_attended / total_classes * 100) if total_classes > 0 else 0
-        
-        # Get weekly performance
-        performance_ref = db.collection('student_performance').where('usn', '==', usn).stream()
-        weekly_performance = [perf.to_dict() for perf in performance_ref]
-        
-        # Get assigned documents (PPT, PDF)
-        documents_ref = db.collection('study_materials').where('assigned_to', 'array_contains', usn).stream()
-        assigned_documents = [doc.to_dict() for doc in documents_ref]
-        
-        return jsonify({
-            "student_info": student_data,
-            "attendance": {
-                "total_classes": total_classes,
-                "classes_attended": classes_attended,
-                "attendance_percentage": attendance_percentage,
-                "attendance_history": attendance_data
-            },
-            "weekly_performance": weekly_performance,
-            "assigned_documents": assigned_documents
-        }), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    tenant, error = request_tenant()
+    if error:
+        return error
+    doc = router.get('students', usn, tenant)
+    
+    if not doc.exists:
+        return jsonify({"error": "Student profile not found."}), 404
+    
+    # Get base student data
+    student_data = doc.to_dict()
+    
+    # Get attendance details
+    attendance_docs = router.stream('attendance', lambda ref: ref.where('usn', '==', usn), tenant)
+    attendance_data = []
+    total_classes = 0
+    classes_attended = 0
+    
+    for attendance in attendance_docs:
+        att_data = attendance.to_dict()
+        attendance_data.append(att_data)
+        total_classes += 1
+        if att_data.get('present', False):
+            classes_attended += 1
+    
+    # Calculate attendance percentage
+    attendance_percentage = (classes_attended / total_classes * 100) if total_classes > 0 else 0
+    
+    # Get weekly performance
+    performance_ref = db.collection('student_performance').where('usn', '==', usn).stream()
+    weekly_performance = [perf.to_dict() for perf in performance_ref]
+    
+    # Get assigned documents (PPT, PDF)
+    documents_ref = db.collection('study_materials').where('assigned_to', 'array_contains', usn).stream()
+    assigned_documents = [doc.to_dict() for doc in documents_ref]
+    
+    return jsonify({
+        "student_info": student_data,
+        "attendance": {
+            "total_classes": total_classes,
+            "classes_attended": classes_attended,
+            "attendance_percentage": attendance_percentage,
+            "attendance_history": attendance_data
+        },
+        "weekly_performance": weekly_performance,
+        "assigned_documents": assigned_documents
+    }), 200
 
 # New endpoint for AI chatbot interactions
 @app.route('/student/chat', methods=['POST'])
 def student_chat():
-    try:
-        data = request.json
-        student_query = data.get('query')
-        document_id = data.get('document_id')  # Optional, if asking about specific document
-        
-        # Here you would integrate with your AI service
-        # For now, returning a placeholder response
-        response = {
-            "answer": f"This is a placeholder response for: {student_query}",
-            "related_documents": []
-        }
-        
-        return jsonify(response), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    data, error = parse_request(StudentChat, "Query is required.")
+    if error:
+        return error
+    student_query = data.query
+    document_id = data.document_id  # Optional, if asking about specific document
+    
+    # Here you would integrate with your AI service
+    # For now, returning a placeholder response
+    response = {
+        "answer": f"This is a placeholder response for: {student_query}",
+        "related_documents": []
+    }
+    
+    return jsonify(response), 200
 @app.route('/signup/faculty', methods=['POST'])
 def faculty_signup():
-    try:
-        data = request.json
-        teacher_code = data.get('teacher_code')
-        name = data.get('name')
-        email = data.get('email')
-        
-        if not all([teacher_code, name, email]):
-            return jsonify({"error": "Teacher code, name, and email are required for signup."}), 400
-
-        faculty_ref = db.collection('teachers').document(teacher_code)
-        if faculty_ref.get().exists:
-            return jsonify({"error": "Faculty with this teacher code already exists."}), 409
-
-        faculty_ref.set({
-            "name": name,
-            "email": email,
-            "teacher_code": teacher_code,
-            "created_at": firestore.SERVER_TIMESTAMP
-        })
-        
-        return jsonify({"success": True, "message": "Faculty profile created successfully!"}), 201
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    data, error = parse_request(FacultySignup, "Teacher code, name, and email are required for signup.")
+    if error:
+        return error
+    teacher_code = data.teacher_code
+    name = data.name
+    email = data.email
+
+    tenant = tenant_id(data.college_name)
+    if tenant is None and router.requires_tenant:
+        return jsonify({"error": "College name is required for signup."}), 400
+    if router.get('teachers', teacher_code, tenant).exists:
+        return jsonify({"error": "Faculty with this teacher code already exists."}), 409
+
+    faculty_ref = router.document('teachers', teacher_code, tenant)
+    faculty_ref.set({
+        "name": name,
+        "email": email,
+        "teacher_code": teacher_code,
+        "college_name": data.college_name,
+        "created_at": firestore.SERVER_TIMESTAMP
+    })
+    
+    return jsonify({"success": True, "message": "Faculty profile created successfully!"}), 201
 
 @app.route('/faculty/profile/<teacher_code>', methods=['GET'])
 def get_faculty_profile(teacher_code):
-    try:
-        faculty_ref = db.collection('teachers').document(teacher_code)
-        doc = faculty_ref.get()
-        
-        if not doc.exists:
-            return jsonify({"error": "Faculty profile not found."}), 404
-        
-        return jsonify(doc.to_dict()), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    tenant, error = request_tenant()
+    if error:
+        return error
+    doc = router.get('teachers', teacher_code, tenant)
+    
+    if not doc.exists:
+        return jsonify({"error": "Faculty profile not found."}), 404
+    
+    return jsonify(doc.to_dict()), 200
     # Route to display the faculty dashboard
 @app.route('/dashboard/faculty/<teacher_code>', methods=['GET'])
 def faculty_dashboard(teacher_code):
-    try:
-        # Retrieve the faculty member's profile
-        faculty_ref = db.collection('teachers').document(teacher_code)
-        faculty_profile = faculty_ref.get()
-
-        if not faculty_profile.exists:
-            return jsonify({"error": "Faculty profile not found."}), 404
-        
-        # Retrieve classes associated with the faculty member
-        classes_ref = db.collection('classrooms').where('teacher_code', '==', teacher_code)
-        classes_docs = classes_ref.stream()
-        
-        my_classes = []
-        for doc in classes_docs:
-            class_data = doc.to_dict()
-            class_data['classroom_id'] = doc.id
-            
-            # Get student performance for this class
-            performance_ref = db.collection('student_performance').where('classroom_id', '==', doc.id).stream()
-            class_performance = [perf.to_dict() for perf in performance_ref]
-            
-            # Get attendance data for this class
-            attendance_ref = db.collection('attendance').where('classroom_id', '==', doc.id).stream()
-            attendance_data = [att.to_dict() for att in attendance_ref]
-            
-            # Calculate class statistics
-            total_students = len(class_data.get('students', []))
-            avg_attendance = sum(len(att.get('present_students', [])) for att in attendance_data) / len(attendance_data) if attendance_data else 0
-            
-            class_data.update({
-                'total_students': total_students,
-                'average_attendance': avg_attendance,
-                'performance_data': class_performance,
-                'attendance_history': attendance_data
-            })
-            
-            my_classes.append(class_data)
+    tenant, error = request_tenant()
+    if error:
+        return error
+    return serve_cached('faculty_dashboard', {"teacher_code": teacher_code, "tenant": tenant},
+                        f"faculty_dashboard:{tenant}:{teacher_code}")
+
+@job('faculty_dashboard')
+def build_faculty_dashboard(teacher_code, tenant=None):
+    # Retrieve the faculty member's profile
+    faculty_profile = router.get('teachers', teacher_code, tenant)
+
+    if not faculty_profile.exists:
+        return {"status": 404, "body": {"error": "Faculty profile not found."}}
+    
+    # Retrieve classes associated with the faculty member
+    classes_docs = router.stream('classrooms', lambda ref: ref.where('teacher_code', '==', teacher_code), tenant)
+    
+    my_classes = []
+    for doc in classes_docs:
+        class_data = doc.to_dict()
+        class_data['classroom_id'] = doc.id
+        
+        # Get student performance for this class
+        performance_ref = db.collection('student_performance').where('classroom_id', '==', doc.id).stream()
+        class_performance = [perf.to_dict() for perf in performance_ref]
+        
+        # Get attendance data for this class
+        attendance_ref = router.stream('attendance', lambda ref: ref.where('classroom_id', '==', doc.id), tenant)
+        attendance_data = [att.to_dict() for att in attendance_ref]
+        
+        # Calculate class statistics
+        total_students = len(class_data.get('students', []))
+        avg_attendance = sum(len(att.get('present_students', [])) for att in attendance_data) / len(attendance_data) if attendance_data else 0
+        
+        class_data.update({
+            'total_students': total_students,
+            'average_attendance': avg_attendance,
+            'performance_data': class_performance,
+            'attendance_history': attendance_data
+        })
         
-        return jsonify({
-            "success": True,
-            "message": "Faculty dashboard data retrieved.",
-            "profile": faculty_profile.to_dict(),
-            "my_classes": my_classes
-        }), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        my_classes.append(class_data)
+    
+    return {"status": 200, "body": {
+        "success": True,
+        "message": "Faculty dashboard data retrieved.",
+        "profile": faculty_profile.to_dict(),
+        "my_classes": my_classes
+    }}
 
 # Route to create a new class
 @app.route('/create_class', methods=['POST'])
 def create_class():
-    try:
-        data = request.json
-        classroom_id = data.get('classroom_id')
-        teacher_code = data.get('teacher_code')
-        college_name = data.get('college_name')
-        subject = data.get('subject', '')  # Optional subject name
-        max_students = data.get('max_students', 60)  # Default max students
-        
-        if not all([classroom_id, teacher_code, college_name]):
-            return jsonify({"error": "Classroom ID, teacher code, and college name are required."}), 400
-
-        # Check if the teacher code exists
-        teacher_ref = db.collection('teachers').document(teacher_code).get()
-        if not teacher_ref.exists:
-            return jsonify({"error": "Invalid teacher code."}), 401
-
-        # Check if classroom already exists
-        existing_class = db.collection('classrooms').document(classroom_id).get()
-        if existing_class.exists:
-            return jsonify({"error": "Classroom ID already exists."}), 409
-
-        # Save the new class to the database
-        classroom_ref = db.collection('classrooms').document(classroom_id)
-        classroom_ref.set({
-            "teacher_code": teacher_code,
-            "college_name": college_name,
-            "subject": subject,
-            "max_students": max_students,
-            "current_students": 0,
-            "students": [],
-            "is_active": True,
-            "created_at": firestore.SERVER_TIMESTAMP,
-            "last_updated": firestore.SERVER_TIMESTAMP
-        })
-        
-        return jsonify({"success": True, "message": "Class created successfully!"}), 201
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    data, error = parse_request(CreateClass, "Classroom ID, teacher code, and college name are required.")
+    if error:
+        return error
+    classroom_id = data.classroom_id
+    teacher_code = data.teacher_code
+    college_name = data.college_name
+    subject = data.subject  # Optional subject name
+    max_students = data.max_students  # Default max students
+
+    tenant = tenant_id(college_name)
+
+    # Check if the teacher code exists
+    teacher_ref = router.get('teachers', teacher_code, tenant)
+    if not teacher_ref.exists:
+        return jsonify({"error": "Invalid teacher code."}), 401
+
+    # Check if classroom already exists (classroom IDs stay globally unique via the tenant index)
+    existing_class = router.get('classrooms', classroom_id, tenant)
+    if existing_class.exists or router.tenant_for_classroom(classroom_id):
+        return jsonify({"error": "Classroom ID already exists."}), 409
+
+    # Save the new class to the database
+    classroom_ref = router.document('classrooms', classroom_id, tenant)
+    classroom_ref.set({
+        "teacher_code": teacher_code,
+        "college_name": college_name,
+        "subject": subject,
+        "max_students": max_students,
+        "current_students": 0,
+        "students": [],
+        "is_active": True,
+        "created_at": firestore.SERVER_TIMESTAMP,
+        "last_updated": firestore.SERVER_TIMESTAMP
+    })
+    router.register_classroom(classroom_id, tenant)
+    
+    return jsonify({"success": True, "message": "Class created successfully!"}), 201
 @app.route('/my_classes/<teacher_code>', methods=['GET'])
 def get_my_classes(teacher_code):
-    try:
-        # Retrieve all classes associated with the given teacher_code
-        classes_ref = db.collection('classrooms').where('teacher_code', '==', teacher_code)
-        docs = classes_ref.stream()
-
-        class_list = []
-        for doc in docs:
-            class_data = doc.to_dict()
-            class_data['classroom_id'] = doc.id
-            class_list.append(class_data)
-        
-        return jsonify(class_list), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    # Retrieve all classes associated with the given teacher_code
+    tenant, error = request_tenant()
+    if error:
+        return error
+    docs = router.stream('classrooms', lambda ref: ref.where('teacher_code', '==', teacher_code), tenant)
+
+    class_list = []
+    for doc in docs:
+        class_data = doc.to_dict()
+        class_data['classroom_id'] = doc.id
+        class_list.append(class_data)
+    
+    return jsonify(class_list), 200
 @app.route('/class_details/<classroom_id>', methods=['GET'])
+@serve_stale(stale_cache)
 def get_class_details(classroom_id):
-    try:
-        # 1. Retrieve the classroom details
-        classroom_ref = db.collection('classrooms').document(classroom_id)
-        classroom_doc = classroom_ref.get()
-
-        if not classroom_doc.exists:
-            return jsonify({"error": "Classroom not found."}), 404
-
-        class_details = classroom_doc.to_dict()
-        class_details['classroom_id'] = classroom_doc.id
-
-        # 2. Get enrolled students details
-        enrolled_students = []
-        student_usns = class_details.get('students', [])
-        for usn in student_usns:
-            student_ref = db.collection('students').document(usn).get()
-            if student_ref.exists:
-                student_data = student_ref.to_dict()
-                enrolled_students.append(student_data)
-
-        # 3. Get today's attendance
-        today = firestore.SERVER_TIMESTAMP
-        attendance_ref = db.collection('attendance')\
-            .where('classroom_id', '==', classroom_id)\
-            .order_by('date', direction=firestore.Query.DESCENDING)\
-            .limit(1)\
-            .stream()
-        
-        today_attendance = next(attendance_ref, None)
-        present_students = len(today_attendance.get('present_students', [])) if today_attendance else 0
-
-        # 4. Get recent study materials
-        materials_ref = db.collection('study_materials')\
-            .where('classroom_id', '==', classroom_id)\
-            .order_by('uploaded_at', direction=firestore.Query.DESCENDING)\
-            .limit(5)\
-            .stream()
-        recent_materials = [mat.to_dict() for mat in materials_ref]
-
-        # 5. Calculate class statistics
-        total_enrolled = len(enrolled_students)
-        attendance_percentage = (present_students / total_enrolled * 100) if total_enrolled > 0 else 0
+    # 1. Retrieve the classroom details
+    tenant, error = classroom_tenant(classroom_id)
+    if error:
+        return error
+    classroom_doc = router.get('classrooms', classroom_id, tenant)
+
+    if not classroom_doc.exists:
+        return jsonify({"error": "Classroom not found."}), 404
+
+    class_details = classroom_doc.to_dict()
+    class_details['classroom_id'] = classroom_doc.id
+
+    # 2. Get enrolled students details
+    enrolled_students = []
+    student_usns = class_details.get('students', [])
+    for usn in student_usns:
+        student_ref = router.get('students', usn, tenant)
+        if student_ref.exists:
+            student_data = student_ref.to_dict()
+            enrolled_students.append(student_data)
+
+    # 3. Get today's attendance
+    today = firestore.SERVER_TIMESTAMP
+    attendance_docs = router.stream('attendance', lambda ref: ref
+        .where('classroom_id', '==', classroom_id)
+        .order_by('date', direction=firestore.Query.DESCENDING)
+        .limit(1), tenant)
+    
+    # Dual mode can return the latest record from each layout
+    today_attendance = max(attendance_docs, key=lambda att: att.get('date'), default=None)
+    present_students = len(today_attendance.get('present_students', [])) if today_attendance else 0
+
+    # 4. Get recent study materials
+    materials_ref = db.collection('study_materials')\
+        .where('classroom_id', '==', classroom_id)\
+        .order_by('uploaded_at', direction=firestore.Query.DESCENDING)\
+        .limit(5)\
+        .stream()
+    recent_materials = [mat.to_dict() for mat in materials_ref]
+
+    # 5. Calculate class statistics
+    total_enrolled = len(enrolled_students)
+    attendance_percentage = (present_students / total_enrolled * 100) if total_enrolled > 0 else 0
 
-        return jsonify({
-            "success": True,
-            "class_details": {
-                **class_details,
-                "enrolled_students": enrolled_students,
-                "total_enrolled": total_enrolled,
-                "today_attendance": {
-                    "present": present_students,
-                    "percentage": attendance_percentage
-                }
-            },
-            "recent_materials": recent_materials
-        }), 200
+    return jsonify({
+        "success": True,
+        "class_details": {
+            **class_details,
+            "enrolled_students": enrolled_students,
+            "total_enrolled": total_enrolled,
+            "today_attendance": {
+                "present": present_students,
+                "percentage": attendance_percentage
+            }
+        },
+        "recent_materials": recent_materials
+    }), 200
 
-        return jsonify({
-            "success": True,
-            "message": f"Details for class {classroom_id} retrieved.",
-            "class_details": class_details,
-            "student_details": student_list,
-            "topics_covered": topics_covered,
-            "schedule": schedule,
-            "notes": notes
-        }), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    return jsonify({
+        "success": True,
+        "message": f"Details for class {classroom_id} retrieved.",
+        "class_details": class_details,
+        "student_details": student_list,
+        "topics_covered": topics_covered,
+        "schedule": schedule,
+        "notes": notes
+    }), 200
 @app.route('/class_details/<classroom_id>/confirm', methods=['POST'])
 def confirm_class_details(classroom_id):
-    try:
-        # Update the class status to 'confirmed' or 'active'
-        classroom_ref = db.collection('classrooms').document(classroom_id)
-        classroom_ref.update({"status": "confirmed"})
+    # Update the class status to 'confirmed' or 'active'
+    tenant, error = classroom_tenant(classroom_id)
+    if error:
+        return error
+    classroom_ref = router.document('classrooms', classroom_id, tenant)
+    classroom_ref.update({"status": "confirmed"})
 
-        return jsonify({
-            "success": True,
-            "message": f"Class {classroom_id} details confirmed. Redirecting to dashboard."
-        }), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    return jsonify({
+        "success": True,
+        "message": f"Class {classroom_id} details confirmed. Redirecting to dashboard."
+    }), 200
 @app.route('/login/faculty', methods=['POST'])
 def faculty_login():
-    try:
-        data = request.json
-        teacher_code = data.get('teacher_code')
-        college_name = data.get('college_name')
-
-        if not all([teacher_code, college_name]):
-            return jsonify({"error": "Teacher code and college name are required."}), 400
-
-        # Verify the teacher code in the database
-        teacher_ref = db.collection('teachers').document(teacher_code).get()
-        if not teacher_ref.exists:
-            return jsonify({"error": "Invalid teacher code."}), 401
-
-        # Generate a unique ID for the classroom
-        classroom_id = f"{college_name}_{block_name}_{classroom_name}".replace(" ", "_").lower()
-
-        # Update or create the classroom data in Firestore
-        classroom_ref = db.collection('classrooms').document(classroom_id)
-        classroom_ref.set({
-            "college_name": college_name,
-            "block_name": block_name,
-            "classroom_name": classroom_name,
-            "teacher_code": teacher_code,
-            "is_active": True,
-            "last_login": firestore.SERVER_TIMESTAMP
-        }, merge=True)
-        
-        # Return the dashboard options for the frontend to render
-        dashboard_options = {
-            "take_attendance_url": f"/attendance/{classroom_id}",
-            "notes_url": f"/notes/{classroom_id}",
-            "quiz_url": f"/quiz/{classroom_id}",
-            "dashboard_url": f"/dashboard/faculty/{teacher_code}"
-        }
+    data, error = parse_request(FacultyLogin, "Teacher code and college name are required.")
+    if error:
+        return error
+    teacher_code = data.teacher_code
+    college_name = data.college_name
+
+    # Verify the teacher code in the database
+    tenant = tenant_id(college_name)
+    teacher_ref = router.get('teachers', teacher_code, tenant)
+    if not teacher_ref.exists:
+        return jsonify({"error": "Invalid teacher code."}), 401
+
+    # Generate a unique ID for the classroom
+    classroom_id = f"{college_name}_{block_name}_{classroom_name}".replace(" ", "_").lower()
+
+    # Update or create the classroom data in Firestore
+    classroom_ref = router.document('classrooms', classroom_id, tenant)
+    classroom_ref.set({
+        "college_name": college_name,
+        "block_name": block_name,
+        "classroom_name": classroom_name,
+        "teacher_code": teacher_code,
+        "is_active": True,
+        "last_login": firestore.SERVER_TIMESTAMP
+    }, merge=True)
+    router.register_classroom(classroom_id, tenant)
+    
+    # Return the dashboard options for the frontend to render
+    dashboard_options = {
+        "take_attendance_url": f"/attendance/{classroom_id}",
+        "notes_url": f"/notes/{classroom_id}",
+        "quiz_url": f"/quiz/{classroom_id}",
+        "dashboard_url": f"/dashboard/faculty/{teacher_code}"
+    }
 
-        return jsonify({
-            "success": True, 
-            "message": "Faculty logged in successfully!",
-            "classroom_id": classroom_id,
-            "dashboard_options": dashboard_options
-        }), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    return jsonify({
+        "success": True, 
+        "message": "Faculty logged in successfully!",
+        "classroom_id": classroom_id,
+        "dashboard_options": dashboard_options
+    }), 200
 @app.route('/attendance/<classroom_id>', methods=['POST'])
 def take_attendance(classroom_id):
-    usns = request.json.get('usns')
-    attendance_ref = db.collection('attendance').document()
+    data, error = parse_request(Attendance, "A list of USNs is required.")
+    if error:
+        return error
+    usns = data.usns
+    tenant, error = classroom_tenant(classroom_id)
+    if error:
+        return error
+    attendance_ref = router.document('attendance', tenant=tenant)
 
     attendance_data = {
         "classroom_id": classroom_id,
@@ -457,6 +551,7 @@ def take_attendance(classroom_id):
         "attendance_id": attendance_ref.id
     }), 201
 @app.route('/notes/<classroom_id>', methods=['GET'])
+@serve_stale(stale_cache)
 def get_notes(classroom_id):
     notes_ref = db.collection('notes').where('classroom_id', '==', classroom_id)
     docs = notes_ref.stream()
@@ -469,6 +564,10 @@ def get_notes(classroom_id):
     return jsonify(modules), 200
 @app.route('/student_dashboard/<classroom_id>', methods=['GET'])
 def get_student_dashboard(classroom_id):
+    return serve_cached('student_dashboard', {"classroom_id": classroom_id}, f"student_dashboard:{classroom_id}")
+
+@job('student_dashboard')
+def build_student_dashboard(classroom_id):
     quiz_attempts_ref = db.collection('quiz_attempts').where('classroom_id', '==', classroom_id)
     docs = quiz_attempts_ref.stream()
 
@@ -484,9 +583,12 @@ def get_student_dashboard(classroom_id):
         student_scores[usn] += score
 
     dashboard_data = []
+    tenant = router.tenant_for_classroom(classroom_id)
+    if tenant is None and router.mode == 'tenant':
+        return {"status": 404, "body": {"error": "Classroom not found."}}
     
     for usn, score in student_scores.items():
-        student_ref = db.collection('students').document(usn).get()
+        student_ref = router.get('students', usn, tenant)
         student_name = student_ref.get('name') if student_ref.exists else 'Unknown'
         dashboard_data.append({
             'usn': usn,
@@ -499,81 +601,95 @@ def get_student_dashboard(classroom_id):
     for i, student in enumerate(dashboard_data):
         student['rank'] = i + 1
 
-    return jsonify(dashboard_data), 200
+    return {"status": 200, "body": dashboard_data}
 import requests # Make sure this is installed (pip install requests)
 
 import random  # Add this at the top of your file if not already present
 
 @app.route('/quiz/<classroom_id>/generate', methods=['POST'])
 def generate_quiz(classroom_id):
-    try:
-        quiz_data = request.json
-        topic = quiz_data.get('topic')
-        
-        if not topic:
-            return jsonify({"error": "Topic is required"}), 400
-
-        # Generate a simple quiz (sample questions)
-        sample_questions = [
-            {
-                "question": f"What is {topic}?",
-                "options": [
-                    f"A basic {topic}",
-                    f"An advanced {topic}",
-                    f"A complex {topic}",
-                    f"None of the above"
-                ],
-                "correct_answer": 0
-            },
-            {
-                "question": f"Which of the following is related to {topic}?",
-                "options": [
-                    "Option 1",
-                    "Option 2",
-                    "Option 3",
-                    "All of the above"
-                ],
-                "correct_answer": 3
-            }
-        ]
-        
-        # Save the generated quiz to the 'quizzes' collection
-        quiz_ref = db.collection('quizzes').document()
-        quiz_ref.set({
-            "classroom_id": classroom_id,
-            "topic": topic,
-            "questions": sample_questions,
-            "generated_at": firestore.SERVER_TIMESTAMP
-        })
+    quiz_data, error = parse_request(GenerateQuiz, "Topic is required")
+    if error:
+        return error
+    topic = quiz_data.topic
 
+    if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+        job_id = job_queue.enqueue('generate_quiz', {"classroom_id": classroom_id, "topic": topic})
         return jsonify({
             "success": True,
-            "message": "Quiz generated and saved.",
-            "quiz_id": quiz_ref.id,
-            "quiz_questions": sample_questions
-        }), 201
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+            "message": "Quiz generation queued.",
+            "job_id": job_id,
+            "status_url": f"/jobs/{job_id}"
+        }), 202
+
+    result = build_quiz(classroom_id, topic)
+    return jsonify(result['body']), result['status']
+
+@job('generate_quiz')
+def build_quiz(classroom_id, topic):
+    # Generate a simple quiz (sample questions)
+    sample_questions = [
+        {
+            "question": f"What is {topic}?",
+            "options": [
+                f"A basic {topic}",
+                f"An advanced {topic}",
+                f"A complex {topic}",
+                f"None of the above"
+            ],
+            "correct_answer": 0
+        },
+        {
+            "question": f"Which of the following is related to {topic}?",
+            "options": [
+                "Option 1",
+                "Option 2",
+                "Option 3",
+                "All of the above"
+            ],
+            "correct_answer": 3
+        }
+    ]
+    
+    # Save the generated quiz to the 'quizzes' collection
+    quiz_ref = db.collection('quizzes').document()
+    quiz_ref.set({
+        "classroom_id": classroom_id,
+        "topic": topic,
+        "questions": sample_questions,
+        "generated_at": firestore.SERVER_TIMESTAMP
+    })
+
+    return {"status": 201, "body": {
+        "success": True,
+        "message": "Quiz generated and saved.",
+        "quiz_id": quiz_ref.id,
+        "quiz_questions": sample_questions
+    }}
 
 # Endpoint to save the student's quiz attempt
 @app.route('/quiz/<quiz_id>/attempt', methods=['POST'])
 def save_quiz_attempt(quiz_id):
-    attempt_data = request.json
+    attempt_data, error = parse_request(QuizAttempt, "USN and score are required.")
+    if error:
+        return error
     quiz_attempts_ref = db.collection('quiz_attempts').document()
     quiz_attempts_ref.set({
         "quiz_id": quiz_id,
-        "usn": attempt_data.get('usn'),
-        "score": attempt_data.get('score'),
+        "usn": attempt_data.usn,
+        "score": attempt_data.score,
         "attempted_at": firestore.SERVER_TIMESTAMP
     })
     
     return jsonify({"success": True, "message": "Quiz attempt saved."}), 201
 @app.route('/quiz/response', methods=['POST'])
 def save_quiz_response():
-    data = request.json
-    quiz_id = data.get('quiz_id')
-    usn = data.get('usn')
-    answered = data.get('answered')
+    data, error = parse_request(QuizResponse, "Quiz ID, USN, and answered are required.")
+    if error:
+        return error
+    quiz_id = data.quiz_id
+    usn = data.usn
+    answered = data.answered
     
     response_data = {
         "quiz_id": quiz_id,
@@ -591,92 +707,196 @@ def save_quiz_response():
 # Faculty endpoints for managing marks and materials
 @app.route('/faculty/add-marks', methods=['POST'])
 def add_student_marks():
-    try:
-        data = request.json
-        classroom_id = data.get('classroom_id')
-        usn = data.get('usn')
-        marks_data = data.get('marks')  # { "test1": 85, "assignment1": 90, etc. }
-        
-        if not all([classroom_id, usn, marks_data]):
-            return jsonify({"error": "Missing required fields"}), 400
-            
-        performance_ref = db.collection('student_performance').document()
-        performance_ref.set({
-            "classroom_id": classroom_id,
-            "usn": usn,
-            "marks": marks_data,
-            "timestamp": firestore.SERVER_TIMESTAMP
-        })
-        
-        return jsonify({
-            "success": True,
-            "message": "Marks added successfully"
-        }), 201
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    data, error = parse_request(AddMarks, "Missing required fields")
+    if error:
+        return error
+    classroom_id = data.classroom_id
+    usn = data.usn
+    marks_data = data.marks  # { "test1": 85, "assignment1": 90, etc. }
+        
+    performance_ref = db.collection('student_performance').document()
+    performance_ref.set({
+        "classroom_id": classroom_id,
+        "usn": usn,
+        "marks": marks_data,
+        "timestamp": firestore.SERVER_TIMESTAMP
+    })
+    
+    return jsonify({
+        "success": True,
+        "message": "Marks added successfully"
+    }), 201
 
 @app.route('/faculty/upload-material', methods=['POST'])
 def upload_material():
+    data, error = parse_request(UploadMaterial, "Missing required fields")
+    if error:
+        return error
+    classroom_id = data.classroom_id
+    material_type = data.type  # 'pdf' or 'ppt'
+    material_url = data.url
+    title = data.title
+    assigned_to = data.assigned_to  # List of student USNs
+        
+    material_ref = db.collection('study_materials').document()
+    material_ref.set({
+        "classroom_id": classroom_id,
+        "type": material_type,
+        "url": material_url,
+        "title": title,
+        "assigned_to": assigned_to,
+        "uploaded_at": firestore.SERVER_TIMESTAMP
+    })
+    
+    return jsonify({
+        "success": True,
+        "message": "Material uploaded successfully",
+        "material_id": material_ref.id
+    }), 201
+
+@job('material_derivatives')
+def build_material_derivatives(digest, material_type):
+    # Thumbnail/text extraction for a new blob; retried by the job queue on failure
+    blob_ref = db.collection('material_blobs').document(digest)
     try:
-        data = request.json
-        classroom_id = data.get('classroom_id')
-        material_type = data.get('type')  # 'pdf' or 'ppt'
-        material_url = data.get('url')
-        title = data.get('title')
-        assigned_to = data.get('assigned_to', [])  # List of student USNs
-        
-        if not all([classroom_id, material_type, material_url, title]):
-            return jsonify({"error": "Missing required fields"}), 400
-            
-        material_ref = db.collection('study_materials').document()
-        material_ref.set({
-            "classroom_id": classroom_id,
-            "type": material_type,
-            "url": material_url,
-            "title": title,
-            "assigned_to": assigned_to,
-            "uploaded_at": firestore.SERVER_TIMESTAMP
+        derivatives = extract_derivatives(blob_store, digest, material_type)
+    except Exception as e:
+        # Stay "processing" while the queue will retry; only the last attempt marks the blob failed
+        attempt = current_job()
+        final = attempt is None or attempt['attempts'] >= attempt['max_attempts']
+        blob_ref.update({
+            "status": "failed" if final else "processing",
+            "error": str(e),
+            "processed_at": firestore.SERVER_TIMESTAMP
+        })
+        raise
+    blob_ref.update({
+        "status": "ready",
+        "derivatives": derivatives,
+        "processed_at": firestore.SERVER_TIMESTAMP
+    })
+    return derivatives
+
+@app.route('/faculty/upload-material/file', methods=['POST'])
+def upload_material_file():
+    fields = {**request.form.to_dict(), "assigned_to": request.form.getlist('assigned_to')}
+    data, errors = validate_fields(UploadMaterialFile, fields)
+    if errors is not None:
+        return jsonify({"error": "Missing required fields", "details": errors}), 400
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({"error": "A file is required."}), 400
+
+    # Hash while streaming to disk; identical files share one blob
+    digest, size, created = ingest(blob_store, upload.stream)
+    blob_ref = db.collection('material_blobs').document(digest)
+    if created or not blob_ref.get().exists:
+        blob_ref.set({
+            "size": size,
+            "type": data.type,
+            "content_type": upload.mimetype,
+            "status": "processing",
+            "created_at": firestore.SERVER_TIMESTAMP
+        })
+        job_queue.enqueue('material_derivatives', {"digest": digest, "material_type": data.type},
+                          key=f"material_derivatives:{digest}")
+
+    # One reference per classroom; re-uploading the same file updates it
+    existing = db.collection('study_materials')\
+        .where('classroom_id', '==', data.classroom_id)\
+        .where('blob_sha256', '==', digest)\
+        .limit(1)\
+        .stream()
+    existing_material = next(existing, None)
+    if existing_material:
+        db.collection('study_materials').document(existing_material.id).update({
+            "title": data.title,
+            "assigned_to": firestore.ArrayUnion(data.assigned_to),
+            "updated_at": firestore.SERVER_TIMESTAMP
         })
-        
         return jsonify({
             "success": True,
-            "message": "Material uploaded successfully",
-            "material_id": material_ref.id
-        }), 201
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+            "message": "Material already in this classroom; title and assignments updated",
+            "material_id": existing_material.id,
+            "sha256": digest
+        }), 200
+
+    material_ref = db.collection('study_materials').document()
+    material_ref.set({
+        "classroom_id": data.classroom_id,
+        "type": data.type,
+        "url": f"/materials/blob/{digest}",
+        "blob_sha256": digest,
+        "size": size,
+        "title": data.title,
+        "assigned_to": data.assigned_to,
+        "uploaded_at": firestore.SERVER_TIMESTAMP
+    })
+
+    return jsonify({
+        "success": True,
+        "message": "Material uploaded successfully",
+        "material_id": material_ref.id,
+        "sha256": digest,
+        "deduplicated": not created
+    }), 201
+
+@app.route('/materials/blob/<digest>', methods=['GET'])
+@app.route('/materials/blob/<digest>/<kind>', methods=['GET'])
+def get_material_blob(digest, kind=None):
+    if not re.fullmatch(r'[0-9a-f]{64}', digest) or kind not in (None, 'thumbnail', 'text'):
+        return jsonify({"error": "Material not found."}), 404
+    key = derivative_key(digest, kind) if kind else digest
+    if not blob_store.exists(key):
+        return jsonify({"error": "Material not found."}), 404
+    mimetype = {"thumbnail": "image/png", "text": "text/plain"}.get(kind, "application/octet-stream")
+    return send_file(blob_store.open(key), mimetype=mimetype, max_age=31536000)  # Content-addressed, never changes
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    job_info = job_queue.get(job_id)
+    if job_info is None:
+        return jsonify({"error": "Job not found."}), 404
+    return jsonify({
+        "job_id": job_info['id'],
+        "name": job_info['name'],
+        "status": job_info['status'],  # queued, running, done or failed
+        "attempts": job_info['attempts'],
+        "max_attempts": job_info['max_attempts'],
+        "error": job_info['error'],
+        "result": job_info['result']
+    }), 200
 
 @app.route('/student/attendance/summary/<usn>', methods=['GET'])
 def get_student_attendance_summary(usn):
-    try:
-        # Get all attendance records for the student
-        attendance_ref = db.collection('attendance')
-        attendance_docs = attendance_ref.where('present_students', 'array_contains', usn).stream()
-        
-        attendance_history = []
-        total_classes = 0
-        classes_attended = 0
-        
-        for doc in attendance_docs:
-            data = doc.to_dict()
-            attendance_history.append(data)
-            total_classes += 1
-            if usn in data.get('present_students', []):
-                classes_attended += 1
-        
-        attendance_percentage = (classes_attended / total_classes * 100) if total_classes > 0 else 0
-        
-        return jsonify({
-            "success": True,
-            "summary": {
-                "total_classes": total_classes,
-                "classes_attended": classes_attended,
-                "attendance_percentage": attendance_percentage
-            },
-            "attendance_history": attendance_history
-        }), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    # Get all attendance records for the student
+    tenant, error = request_tenant()
+    if error:
+        return error
+    attendance_docs = router.stream('attendance', lambda ref: ref.where('present_students', 'array_contains', usn), tenant)
+    
+    attendance_history = []
+    total_classes = 0
+    classes_attended = 0
+    
+    for doc in attendance_docs:
+        data = doc.to_dict()
+        attendance_history.append(data)
+        total_classes += 1
+        if usn in data.get('present_students', []):
+            classes_attended += 1
+    
+    attendance_percentage = (classes_attended / total_classes * 100) if total_classes > 0 else 0
+    
+    return jsonify({
+        "success": True,
+        "summary": {
+            "total_classes": total_classes,
+            "classes_attended": classes_attended,
+            "attendance_percentage": attendance_percentage
+        },
+        "attendance_history": attendance_history
+    }), 200
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,143 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import zipfile
+from contextlib import contextmanager
+
+try:
+    import fitz  # PyMuPDF, optional: PDF thumbnails and text extraction
+except ImportError:
+    fitz = None
+
+try:
+    from pptx import Presentation  # python-pptx, optional: PPT text extraction
+except ImportError:
+    Presentation = None
+
+# Content-addressed storage for uploaded study materials. Files are hashed
+# while they are streamed to a staging file, so identical uploads (the same
+# PDF for every section) end up as a single blob keyed by its SHA-256.
+
+CHUNK_SIZE = 1024 * 1024
+THUMBNAIL_WIDTH = 320
+
+
+class BlobStore:
+    """Interface for blob backends; subclass it to plug in an object store."""
+
+    staging_dir = None  # Where uploads are spooled while hashing (None = system temp dir)
+
+    def exists(self, key):
+        raise NotImplementedError
+
+    def put_file(self, key, path):
+        """Move the local file at `path` into the store under `key`."""
+        raise NotImplementedError
+
+    def put_bytes(self, key, data):
+        raise NotImplementedError
+
+    def open(self, key):
+        raise NotImplementedError
+
+    @contextmanager
+    def local_path(self, key):
+        """Yield a local filesystem path holding the blob, downloading it if needed."""
+        with tempfile.NamedTemporaryFile() as tmp, self.open(key) as src:
+            shutil.copyfileobj(src, tmp, CHUNK_SIZE)
+            tmp.flush()
+            yield tmp.name
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root):
+        self.root = root
+        self.staging_dir = os.path.join(root, 'staging')
+        os.makedirs(self.staging_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def put_file(self, key, path):
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)  # Atomic, so concurrent identical uploads are harmless
+
+    def put_bytes(self, key, data):
+        with tempfile.NamedTemporaryFile(dir=self.staging_dir, delete=False) as tmp:
+            tmp.write(data)
+        self.put_file(key, tmp.name)
+
+    def open(self, key):
+        return open(self._path(key), 'rb')
+
+    @contextmanager
+    def local_path(self, key):
+        yield self._path(key)
+
+
+def ingest(store, stream, chunk_size=CHUNK_SIZE):
+    """Stream an upload into the store, hashing it chunk by chunk.
+
+    Returns `(sha256, size, created)`; `created` is False when an identical
+    blob was already stored and the new copy was discarded.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=store.staging_dir, delete=False) as tmp:
+        try:
+            for chunk in iter(lambda: stream.read(chunk_size), b''):
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+        except BaseException:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+
+    key = digest.hexdigest()
+    try:
+        if store.exists(key):
+            return key, size, False
+        store.put_file(key, tmp.name)
+        return key, size, True
+    finally:
+        if os.path.exists(tmp.name):
+            os.remove(tmp.name)  # Duplicate, or put_file failed before taking the file
+
+
+def derivative_key(key, kind):
+    return f"{key}.{'thumb.png' if kind == 'thumbnail' else 'txt'}"
+
+
+def extract_derivatives(store, key, material_type):
+    """Generate a thumbnail and extracted text for a blob, where the optional libraries allow it."""
+    derivatives = {}
+    with store.local_path(key) as path:
+        if material_type == 'pdf' and fitz is not None:
+            with fitz.open(path) as doc:
+                if doc.page_count:
+                    page = doc[0]
+                    zoom = THUMBNAIL_WIDTH / page.rect.width
+                    pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+                    store.put_bytes(derivative_key(key, 'thumbnail'), pixmap.tobytes('png'))
+                    derivatives['thumbnail'] = True
+                text = '\n'.join(page.get_text() for page in doc)
+            store.put_bytes(derivative_key(key, 'text'), text.encode('utf-8'))
+            derivatives['text'] = True
+        elif material_type in ('ppt', 'pptx') and Presentation is not None and zipfile.is_zipfile(path):
+            # python-pptx only reads OOXML; legacy binary .ppt files get no text extraction
+            presentation = Presentation(path)
+            text = '\n'.join(
+                shape.text_frame.text
+                for slide in presentation.slides
+                for shape in slide.shapes
+                if shape.has_text_frame
+            )
+            store.put_bytes(derivative_key(key, 'text'), text.encode('utf-8'))
+            derivatives['text'] = True
+    return derivatives
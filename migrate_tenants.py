@@ -0,0 +1,182 @@
+import argparse
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from google.api_core.exceptions import Conflict
+except ImportError:
+    Conflict = FileExistsError
+
+from tenancy import TENANT_COLLECTIONS, TENANT_INDEX, tenant_id
+
+# Copies the flat students/teachers/classrooms/attendance collections into
+# colleges/<tenant>/... Run it while the app is in TENANT_MODE=dual so new
+# writes land in both layouts, then switch to TENANT_MODE=tenant.
+#
+# Documents are re-read when their chunk is written and copied with a
+# create-only precondition. A tenant copy that already exists was written by
+# the app's dual writes (or a previous run) and is at least as new as the
+# flat one, so it is never overwritten and the tool can be re-run safely.
+#
+# Students and teachers that cannot be attributed to any college would be
+# locked out after cutover; they are listed and the tool exits non-zero.
+
+BATCH_SIZE = 400  # Firestore caps a batch at 500 writes
+
+
+def attribute_tenants(db):
+    """Work out which tenant(s) each legacy document belongs to.
+
+    Returns `(doc_ids, tenants)`: the ids found per collection and, per
+    collection, a mapping of document id to the set of tenants it belongs to.
+    """
+    tenants = {name: defaultdict(set) for name in TENANT_COLLECTIONS}
+    doc_ids = {name: set() for name in TENANT_COLLECTIONS}
+
+    for doc in db.collection('classrooms').stream():
+        data = doc.to_dict()
+        doc_ids['classrooms'].add(doc.id)
+        tenant = tenant_id(data.get('college_name'))
+        if not tenant:
+            continue
+        tenants['classrooms'][doc.id].add(tenant)
+        if data.get('teacher_code'):
+            tenants['teachers'][data['teacher_code']].add(tenant)
+        for usn in data.get('students', []):
+            tenants['students'][usn].add(tenant)
+
+    for name in ('students', 'teachers'):
+        for doc in db.collection(name).stream():
+            doc_ids[name].add(doc.id)
+            tenant = tenant_id(doc.to_dict().get('college_name'))
+            if tenant:
+                tenants[name][doc.id].add(tenant)
+
+    for doc in db.collection('attendance').stream():
+        data = doc.to_dict()
+        doc_ids['attendance'].add(doc.id)
+        classroom_tenants = tenants['classrooms'].get(data.get('classroom_id'), set())
+        tenants['attendance'][doc.id] |= classroom_tenants
+        # Students who attended a class belong to that class's college
+        for usn in data.get('present_students') or []:
+            tenants['students'][usn] |= classroom_tenants
+        if data.get('usn'):
+            tenants['students'][data['usn']] |= classroom_tenants
+
+    for doc in db.collection('student_performance').stream():
+        data = doc.to_dict()
+        if data.get('usn'):
+            tenants['students'][data['usn']] |= tenants['classrooms'].get(data.get('classroom_id'), set())
+
+    return doc_ids, tenants
+
+
+def plan_copies(doc_ids, tenants):
+    """Yield (source path, target path) for every tenant copy."""
+    for name in TENANT_COLLECTIONS:
+        for doc_id in doc_ids[name]:
+            for tenant in tenants[name].get(doc_id, ()):
+                yield (name, doc_id), ('colleges', tenant, name, doc_id)
+
+
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def copy_chunk(db, chunk):
+    """Copy a chunk of documents using their current flat contents, never overwriting tenant copies."""
+    snapshots = {snapshot.reference.path: snapshot
+                 for snapshot in db.get_all([db.document(*source) for source, _ in chunk])}
+    copies = []
+    for source, target in chunk:
+        snapshot = snapshots.get('/'.join(source))
+        if snapshot is not None and snapshot.exists:
+            copies.append((db.document(*target), snapshot.to_dict()))
+
+    batch = db.batch()
+    for ref, data in copies:
+        batch.create(ref, data)
+    try:
+        batch.commit()
+        return len(copies)
+    except Conflict:
+        pass  # Some tenant copies already exist; create the rest one by one
+
+    copied = 0
+    for ref, data in copies:
+        try:
+            ref.create(data)
+            copied += 1
+        except Conflict:
+            pass
+    return copied
+
+
+def write_index_chunk(db, chunk):
+    batch = db.batch()
+    for classroom_id, tenant in chunk:
+        batch.set(db.collection(TENANT_INDEX).document(classroom_id), {"tenant": tenant})
+    batch.commit()
+    return len(chunk)
+
+
+def migrate(db, workers=8, batch_size=BATCH_SIZE, dry_run=False):
+    """Copy everything that can be attributed; return the ids of stranded students and teachers."""
+    doc_ids, tenants = attribute_tenants(db)
+    stranded = {}
+    for name in sorted(TENANT_COLLECTIONS):
+        unattributed = sorted(doc_id for doc_id in doc_ids[name] if not tenants[name].get(doc_id))
+        print(f"{name}: {len(doc_ids[name])} documents, {len(unattributed)} without a college")
+        if name in ('students', 'teachers') and unattributed:
+            stranded[name] = unattributed
+
+    copies = list(plan_copies(doc_ids, tenants))
+    index = [(classroom_id, tenant)
+             for classroom_id, classroom_tenants in tenants['classrooms'].items()
+             for tenant in classroom_tenants]
+    if dry_run:
+        print(f"Dry run: {len(copies)} copies and {len(index)} tenant index entries planned")
+        return stranded
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        copied = sum(pool.map(lambda chunk: copy_chunk(db, chunk), chunked(copies, batch_size)))
+        indexed = sum(pool.map(lambda chunk: write_index_chunk(db, chunk), chunked(index, batch_size)))
+    print(f"Copied {copied} of {len(copies)} documents ({len(copies) - copied} already present), "
+          f"wrote {indexed} tenant index entries")
+    return stranded
+
+
+def main(argv=None, db=None):
+    parser = argparse.ArgumentParser(description="Copy flat collections into colleges/<college_name>/... subcollections.")
+    parser.add_argument('--workers', type=int, default=8, help="Parallel batch writers")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Writes per Firestore batch (max 500)")
+    parser.add_argument('--dry-run', action='store_true', help="Only report what would be copied")
+    args = parser.parse_args(argv)
+
+    if db is None:
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
+        cred = credentials.Certificate("serviceAccountKey.json")
+        firebase_admin.initialize_app(cred)
+        db = firestore.client()
+
+    stranded = migrate(db, workers=args.workers, batch_size=min(args.batch_size, 500), dry_run=args.dry_run)
+    if stranded:
+        for name, doc_ids in stranded.items():
+            print(f"BLOCKING: {len(doc_ids)} {name} cannot be attributed to a college: {', '.join(doc_ids)}")
+        print("Set college_name on these documents before switching to TENANT_MODE=tenant.")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,252 @@
+import functools
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from google.api_core import exceptions as google_exceptions
+except ImportError:
+    google_exceptions = None
+
+try:
+    from flask import make_response, request
+except ImportError:
+    make_response = request = None
+
+# Resilience layer around the Firestore client.
+#
+# ResilientClient wraps `firestore.client()` so every get/stream/set/update/
+# add/delete/commit runs within a per-operation deadline and behind a circuit
+# breaker keyed by collection name. The client library's own retry (which can
+# run for about a minute) is switched off; idempotent operations are instead
+# retried with backoff until the deadline, which bounds the whole call.
+# Transient failures (deadlines, quota, unavailability) surface as
+# BackendUnavailable, and an open breaker fails fast instead of waiting out
+# the deadline. StaleCache keeps the last
+# good response of read routes so they can be replayed while Firestore is
+# unhealthy; serve_stale applies it to Flask views.
+
+READ_DEADLINE_SECONDS = float(os.environ.get('FIRESTORE_READ_DEADLINE', 2))
+WRITE_DEADLINE_SECONDS = float(os.environ.get('FIRESTORE_WRITE_DEADLINE', 5))
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 30
+
+OPERATION_DEADLINES = {
+    'get': READ_DEADLINE_SECONDS,
+    'stream': READ_DEADLINE_SECONDS,
+    'set': WRITE_DEADLINE_SECONDS,
+    'update': WRITE_DEADLINE_SECONDS,
+    'add': WRITE_DEADLINE_SECONDS,
+    'delete': WRITE_DEADLINE_SECONDS,
+    'commit': WRITE_DEADLINE_SECONDS,
+}
+
+# add and commit are not retried: a lost response may hide a write that landed
+RETRYABLE_OPERATIONS = {'get', 'stream', 'set', 'update', 'delete'}
+RETRY_BASE_SECONDS = 0.05
+RETRY_MIN_ATTEMPT_SECONDS = 0.05  # Don't start an attempt with less time than this left
+
+TRANSIENT_ERRORS = (TimeoutError, ConnectionError)
+if google_exceptions is not None:
+    TRANSIENT_ERRORS += (
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.InternalServerError,
+        google_exceptions.RetryError,
+    )
+
+_CHAINED = {'where', 'order_by', 'limit', 'limit_to_last', 'offset', 'select',
+            'start_at', 'start_after', 'end_at', 'end_before'}
+
+
+class BackendUnavailable(Exception):
+    """Firestore is timing out, out of quota or otherwise unhealthy."""
+
+
+class CircuitOpenError(BackendUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    """Opens after consecutive transient failures, then lets one trial call through per reset period."""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = 'half_open'  # This caller is the trial; others keep failing fast
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class ResilientClient:
+    def __init__(self, client, deadlines=None, breaker_factory=CircuitBreaker):
+        self._client = client
+        self.deadlines = {**OPERATION_DEADLINES, **(deadlines or {})}
+        self._breaker_factory = breaker_factory
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def collection(self, name):
+        return _Ref(self, self._client.collection(name), name)
+
+    def batch(self):
+        return _Batch(self, self._client.batch())
+
+    def breaker(self, collection):
+        with self._lock:
+            if collection not in self._breakers:
+                self._breakers[collection] = self._breaker_factory()
+            return self._breakers[collection]
+
+    def call(self, collection, operation, func, *args, **kwargs):
+        breaker = self.breaker(collection)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Firestore circuit for '{collection}' is open")
+
+        deadline = time.monotonic() + kwargs.pop('timeout', self.deadlines[operation])
+        kwargs.setdefault('retry', None)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = func(*args, timeout=max(deadline - time.monotonic(), 0), **kwargs)
+                if operation == 'stream':
+                    result = iter(list(result))  # Keep the whole read inside the deadline and breaker
+                break
+            except TRANSIENT_ERRORS as e:
+                delay = RETRY_BASE_SECONDS * 2 ** (attempt - 1) * random.uniform(0.5, 1)
+                if operation in RETRYABLE_OPERATIONS and \
+                        deadline - time.monotonic() - delay >= RETRY_MIN_ATTEMPT_SECONDS:
+                    time.sleep(delay)
+                    continue
+                breaker.record_failure()
+                raise BackendUnavailable(f"{operation} on '{collection}' failed after {attempt} attempt(s): {e}") from e
+            except Exception:
+                breaker.record_success()  # Firestore answered, the request itself was bad
+                raise
+        breaker.record_success()
+        return result
+
+
+class _Ref:
+    """Wraps collection, document and query references, guarding their terminal operations."""
+
+    def __init__(self, client, target, collection):
+        self._client = client
+        self._target = target
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name in _CHAINED or name == 'document':
+            return lambda *args, **kwargs: _Ref(self._client, attr(*args, **kwargs), self._collection)
+        if name == 'collection':
+            return lambda collection, *args, **kwargs: _Ref(self._client, attr(collection, *args, **kwargs), collection)
+        if name in OPERATION_DEADLINES:
+            return lambda *args, **kwargs: self._client.call(self._collection, name, attr, *args, **kwargs)
+        return attr
+
+
+class _Batch:
+    def __init__(self, client, batch):
+        self._client = client
+        self._batch = batch
+        self._collection = None
+
+    def _unwrap(self, ref):
+        if isinstance(ref, _Ref):
+            self._collection = self._collection or ref._collection
+            return ref._target
+        return ref
+
+    def create(self, ref, *args, **kwargs):
+        return self._batch.create(self._unwrap(ref), *args, **kwargs)
+
+    def set(self, ref, *args, **kwargs):
+        return self._batch.set(self._unwrap(ref), *args, **kwargs)
+
+    def update(self, ref, *args, **kwargs):
+        return self._batch.update(self._unwrap(ref), *args, **kwargs)
+
+    def delete(self, ref, *args, **kwargs):
+        return self._batch.delete(self._unwrap(ref), *args, **kwargs)
+
+    def commit(self, **kwargs):
+        return self._client.call(self._collection or 'batch', 'commit', self._batch.commit, **kwargs)
+
+
+class StaleCache:
+    """Bounded LRU of last-known-good values."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """Return `(value, stored_at)` or None."""
+        with self._lock:
+            return self._entries.get(key)
+
+
+def serve_stale(cache):
+    """Decorate a Flask read view to remember its last good response and replay
+    it, marked stale, when the view raises BackendUnavailable."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.full_path
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BackendUnavailable:
+                cached = cache.get(key)
+                if cached is None:
+                    raise
+                (body, mimetype), stored_at = cached
+                stale = make_response(body, 200)
+                stale.mimetype = mimetype
+                stale.headers['Warning'] = '110 - "Response is Stale"'
+                stale.headers['X-Stale'] = 'true'
+                stale.headers['Age'] = str(int(time.time() - stored_at))
+                return stale
+
+            if response.status_code == 200:
+                cache.put(key, (response.get_data(), response.mimetype))
+            return response
+        return wrapper
+    return decorator
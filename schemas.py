@@ -0,0 +1,127 @@
+from typing import Annotated, Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints, ValidationError, model_validator
+
+try:
+    from flask import jsonify, request
+except ImportError:
+    jsonify = request = None  # Only parse_request needs Flask; the FastAPI app does not
+
+# Request body schemas shared by the Flask app (main.py) and the FastAPI app
+# (test_api.py). Pydantic compiles each model's core validator once at class
+# creation, so every request is decoded and validated in a single pass.
+
+# Non-empty string, mirrors the old `all([...])` truthiness checks
+RequiredStr = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
+
+
+class RequestBody(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+
+
+class JsonDocument(RequestBody):
+    # Free-form documents (/users, /quizzes): any non-empty JSON object
+    model_config = ConfigDict(extra='allow')
+
+    @model_validator(mode='after')
+    def _not_empty(self):
+        if not self.model_extra:
+            raise ValueError("document must have at least one field")
+        return self
+
+
+class StudentLogin(RequestBody):
+    usn: RequiredStr
+    classroom_id: RequiredStr
+
+class StudentSignup(RequestBody):
+    usn: RequiredStr
+    name: RequiredStr
+    email: RequiredStr
+    college_name: Optional[str] = None  # Scopes the profile to a college tenant
+
+class StudentChat(RequestBody):
+    query: RequiredStr
+    document_id: Optional[str] = None  # Optional, if asking about specific document
+
+class FacultySignup(RequestBody):
+    teacher_code: RequiredStr
+    name: RequiredStr
+    email: RequiredStr
+    college_name: Optional[str] = None  # Scopes the profile to a college tenant
+
+class FacultyLogin(RequestBody):
+    teacher_code: RequiredStr
+    college_name: RequiredStr
+
+class CreateClass(RequestBody):
+    classroom_id: RequiredStr
+    teacher_code: RequiredStr
+    college_name: RequiredStr
+    subject: str = ''
+    max_students: int = Field(default=60, gt=0)
+
+class UploadMaterial(RequestBody):
+    classroom_id: RequiredStr
+    type: RequiredStr  # 'pdf' or 'ppt'
+    url: RequiredStr
+    title: RequiredStr
+    assigned_to: List[RequiredStr] = []  # List of student USNs
+
+class UploadMaterialFile(RequestBody):
+    classroom_id: RequiredStr
+    type: RequiredStr  # 'pdf' or 'ppt'
+    title: RequiredStr
+    assigned_to: List[RequiredStr] = []  # List of student USNs
+
+class Attendance(RequestBody):
+    usns: List[RequiredStr]
+
+class AddMarks(RequestBody):
+    classroom_id: RequiredStr
+    usn: RequiredStr
+    marks: Dict[str, int] = Field(min_length=1)  # { "test1": 85, "assignment1": 90, etc. }
+
+class GenerateQuiz(RequestBody):
+    topic: RequiredStr
+
+class QuizAttempt(RequestBody):
+    usn: RequiredStr
+    score: float
+
+class QuizResponse(RequestBody):
+    quiz_id: RequiredStr
+    usn: RequiredStr
+    answered: bool  # True for yes, False for no/not answered
+
+
+def validate_body(model, raw):
+    """Decode and validate a raw JSON body against `model`.
+
+    Returns `(body, None)` on success or `(None, errors)` where `errors` is a
+    JSON-serialisable list describing what was wrong with the request.
+    """
+    try:
+        return model.model_validate_json(raw or b''), None
+    except ValidationError as e:
+        return None, e.errors(include_url=False, include_context=False, include_input=False)
+
+
+def validate_fields(model, fields):
+    """Like validate_body, for already-decoded fields such as a multipart form."""
+    try:
+        return model.model_validate(fields), None
+    except ValidationError as e:
+        return None, e.errors(include_url=False, include_context=False, include_input=False)
+
+
+def parse_request(model, message):
+    """Decode and validate the current Flask request body before any DB call.
+
+    Returns `(body, None)`, or `(None, error_response)` with a 400 carrying
+    `message` and the validation details.
+    """
+    body, errors = validate_body(model, request.get_data())
+    if errors is not None:
+        return None, (jsonify({"error": message, "details": errors}), 400)
+    return body, None
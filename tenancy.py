@@ -0,0 +1,131 @@
+import os
+import re
+
+# Tenant-scoped routing of the per-college collections.
+#
+# Each college's data lives under `colleges/<tenant>/<collection>`, where the
+# tenant is derived from the `college_name` passed to create_class,
+# faculty_login and the signups (which also store it on the profile, and
+# require it outside legacy mode). TENANT_MODE controls the cutover:
+#   legacy - read and write the flat top-level collections (old behaviour)
+#   dual   - write both layouts, read the tenant layout and fall back to /
+#            merge with the flat collections for data not migrated yet
+#   tenant - read and write only the tenant layout; lookups of these
+#            collections without a tenant raise TenantRequired
+TENANT_COLLECTIONS = {'students', 'teachers', 'classrooms', 'attendance'}
+TENANT_MODES = ('legacy', 'dual', 'tenant')
+TENANT_MODE = os.environ.get('TENANT_MODE', 'legacy')
+
+# classroom_id -> tenant, global so routes that only know a classroom_id can be routed
+TENANT_INDEX = 'tenant_index'
+
+
+def tenant_id(college_name):
+    """Turn a college name into a Firestore-safe document id."""
+    if not college_name:
+        return None
+    return re.sub(r'[^a-z0-9]+', '_', college_name.strip().lower()).strip('_') or None
+
+
+class TenantRequired(LookupError):
+    """A tenant-scoped collection was accessed without a tenant in tenant mode."""
+
+
+class DualDocument:
+    """Document reference that fans writes out to every layout in use."""
+
+    def __init__(self, db, refs):
+        self._db = db
+        self._refs = refs
+        self.id = refs[0].id
+
+    def set(self, data, merge=False):
+        if len(self._refs) == 1:
+            return self._refs[0].set(data, merge=merge)
+        batch = self._db.batch()
+        for ref in self._refs:
+            batch.set(ref, data, merge=merge)
+        batch.commit()
+
+    def update(self, data):
+        primary, copies = self._refs[-1], self._refs[:-1]
+        if not copies:
+            return primary.update(data)
+        # Write the whole updated document to the copies so a not-yet-migrated
+        # tenant copy is never partial; the precondition makes the batch fail
+        # rather than copy stale fields if the flat document changed meanwhile
+        snapshot = primary.get()
+        update_time = getattr(snapshot, 'update_time', None)
+        batch = self._db.batch()
+        if update_time is not None:
+            batch.update(primary, data, option=self._db.write_option(last_update_time=update_time))
+        else:
+            batch.update(primary, data)
+        for ref in copies:
+            batch.set(ref, {**(snapshot.to_dict() or {}), **data})
+        batch.commit()
+
+
+class TenantRouter:
+    def __init__(self, db, mode=TENANT_MODE):
+        if mode not in TENANT_MODES:
+            raise ValueError(f"TENANT_MODE must be one of {TENANT_MODES}, got {mode!r}")
+        self.db = db
+        self.mode = mode
+        self._classroom_tenants = {}
+
+    @property
+    def requires_tenant(self):
+        # Outside legacy mode, usn/teacher_code lookups are ambiguous without a college
+        return self.mode != 'legacy'
+
+    def _scoped(self, name, tenant):
+        return bool(tenant) and name in TENANT_COLLECTIONS and self.mode != 'legacy'
+
+    def _dual(self, name, tenant):
+        return self._scoped(name, tenant) and self.mode == 'dual'
+
+    def collection(self, name, tenant=None):
+        if self.mode == 'tenant' and name in TENANT_COLLECTIONS and not tenant:
+            # The flat collections are retired after cutover; never fall back to them
+            raise TenantRequired(f"No college known for this {name} lookup")
+        if self._scoped(name, tenant):
+            return self.db.collection('colleges').document(tenant).collection(name)
+        return self.db.collection(name)
+
+    def document(self, name, doc_id=None, tenant=None):
+        """Writable reference; in dual mode writes go to both layouts under the same id."""
+        ref = self.collection(name, tenant).document(doc_id)
+        if not self._dual(name, tenant):
+            return DualDocument(self.db, [ref])
+        return DualDocument(self.db, [ref, self.db.collection(name).document(ref.id)])
+
+    def get(self, name, doc_id, tenant=None):
+        doc = self.collection(name, tenant).document(doc_id).get()
+        if not doc.exists and self._dual(name, tenant):
+            doc = self.db.collection(name).document(doc_id).get()
+        return doc
+
+    def stream(self, name, build, tenant=None):
+        """Run `build(collection)` as a query; in dual mode merge both layouts by document id."""
+        docs = {doc.id: doc for doc in build(self.collection(name, tenant)).stream()}
+        if self._dual(name, tenant):
+            for doc in build(self.db.collection(name)).stream():
+                docs.setdefault(doc.id, doc)
+        return list(docs.values())
+
+    def register_classroom(self, classroom_id, tenant):
+        if self.mode == 'legacy' or not tenant:
+            return
+        self.db.collection(TENANT_INDEX).document(classroom_id).set({"tenant": tenant})
+        self._classroom_tenants[classroom_id] = tenant
+
+    def tenant_for_classroom(self, classroom_id):
+        if self.mode == 'legacy':
+            return None
+        if classroom_id not in self._classroom_tenants:
+            doc = self.db.collection(TENANT_INDEX).document(classroom_id).get()
+            if not doc.exists:
+                return None  # unknown classrooms are not cached so later registrations are seen
+            self._classroom_tenants[classroom_id] = doc.get('tenant')
+        return self._classroom_tenants[classroom_id]
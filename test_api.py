@@ -1,6 +1,5 @@
 from fastapi import FastAPI, Body
-from pydantic import BaseModel
-from typing import List, Dict, Optional
+from schemas import AddMarks, Attendance, CreateClass, FacultySignup, StudentSignup, UploadMaterial
 
 app = FastAPI()
 
@@ -12,49 +11,19 @@ materials = {}
 attendance = {}
 marks = {}
 
-class StudentSignup(BaseModel):
-    usn: str
-    name: str
-    email: str
-
-class FacultySignup(BaseModel):
-    teacher_code: str
-    name: str
-    email: str
-
-class CreateClass(BaseModel):
-    classroom_id: str
-    teacher_code: str
-    college_name: str
-    subject: str
-
-class UploadMaterial(BaseModel):
-    classroom_id: str
-    type: str
-    url: str
-    title: str
-
-class Attendance(BaseModel):
-    usns: List[str]
-
-class AddMarks(BaseModel):
-    classroom_id: str
-    usn: str
-    marks: Dict[str, int]
-
 @app.post("/signup/student")
 def signup_student(data: StudentSignup):
-    students[data.usn] = data.dict()
+    students[data.usn] = data.model_dump()
     return {"message": "Student signed up", "student": data}
 
 @app.post("/signup/faculty")
 def signup_faculty(data: FacultySignup):
-    faculties[data.teacher_code] = data.dict()
+    faculties[data.teacher_code] = data.model_dump()
     return {"message": "Faculty signed up", "faculty": data}
 
 @app.post("/create_class")
 def create_class(data: CreateClass):
-    classes[data.classroom_id] = data.dict()
+    classes[data.classroom_id] = data.model_dump()
     return {"message": "Class created", "class": data}
 
 @app.get("/class_details/{classroom_id}")
@@ -66,7 +35,7 @@ def get_class_details(classroom_id: str):
 
 @app.post("/faculty/upload-material")
 def upload_material(data: UploadMaterial):
-    materials.setdefault(data.classroom_id, []).append(data.dict())
+    materials.setdefault(data.classroom_id, []).append(data.model_dump())
     return {"message": "Material uploaded", "material": data}
 
 @app.post("/attendance/{classroom_id}")
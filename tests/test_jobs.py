@@ -0,0 +1,185 @@
+import time
+
+import pytest
+
+import jobs
+from jobs import JobQueue, WorkerPool, current_job, job
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'jobs.sqlite3'), lease_seconds=60)
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_enqueue_reuses_pending_job_with_same_key(queue):
+    first = queue.enqueue('noop', key='k')
+    assert queue.enqueue('noop', key='k') == first
+    assert queue.enqueue('noop', key='other') != first
+
+
+def test_fail_requeues_with_backoff_then_marks_failed(queue, monkeypatch):
+    monkeypatch.setattr(jobs.random, 'uniform', lambda a, b: 1)
+    job_id = queue.enqueue('noop', max_attempts=2)
+
+    claimed = queue.claim()
+    before = time.time()
+    queue.fail(claimed, 'boom')
+    retry = queue.get(job_id)
+    assert retry['status'] == 'queued'
+    assert retry['run_after'] >= before + jobs.BACKOFF_BASE_SECONDS
+    assert queue.claim() is None  # Still backing off
+
+    queue._conn().execute("UPDATE jobs SET run_after = 0 WHERE id = ?", (job_id,))
+    claimed = queue.claim()
+    assert claimed['attempts'] == 2
+    queue.fail(claimed, 'boom again')
+    assert queue.get(job_id)['status'] == 'failed'
+
+
+def test_expired_lease_counts_as_attempt_and_stops_at_max(queue):
+    job_id = queue.enqueue('noop', max_attempts=2)
+
+    for attempts in (1, 2):
+        assert queue.claim()['attempts'] == attempts
+        # Simulate the worker dying: its lease runs out and any backoff has passed
+        queue._conn().execute("UPDATE jobs SET lease_until = 0 WHERE id = ?", (job_id,))
+        queue.claim()
+        queue._conn().execute("UPDATE jobs SET run_after = 0 WHERE id = ? AND status = 'queued'", (job_id,))
+
+    expired = queue.get(job_id)
+    assert expired['status'] == 'failed'
+    assert expired['attempts'] == 2
+    assert expired['error'] == 'Worker lease expired'
+
+
+def test_expired_lease_is_requeued_with_backoff(queue):
+    job_id = queue.enqueue('noop', max_attempts=3)
+    queue.claim()
+    queue._conn().execute("UPDATE jobs SET lease_until = 0 WHERE id = ?", (job_id,))
+
+    assert queue.claim() is None
+    requeued = queue.get(job_id)
+    assert requeued['status'] == 'queued'
+    assert requeued['run_after'] > time.time()
+
+
+def test_worker_survives_unencodable_result(queue):
+    @job('self_referencing')
+    def self_referencing():
+        result = {}
+        result['self'] = result
+        return result
+
+    @job('add')
+    def add(a, b):
+        return a + b
+
+    bad = queue.enqueue('self_referencing', max_attempts=1)
+    good = queue.enqueue('add', {"a": 1, "b": 2}, key='sum')
+    pool = WorkerPool(queue, concurrency=1, poll_interval=0.01).start()
+    try:
+        assert wait_for(lambda: queue.get(good)['status'] == 'done')
+        assert queue.get(bad)['status'] == 'failed'
+        assert all(thread.is_alive() for thread in pool._threads)
+        assert queue.cached('sum')[0] == 3
+    finally:
+        pool.stop(timeout=1)
+
+
+def test_handlers_see_their_attempt_number(queue, monkeypatch):
+    monkeypatch.setattr(jobs, 'backoff', lambda attempts: 0)
+    seen = []
+
+    @job('flaky')
+    def flaky():
+        attempt = current_job()
+        seen.append((attempt['attempts'], attempt['max_attempts']))
+        raise RuntimeError('still broken')
+
+    job_id = queue.enqueue('flaky', max_attempts=2)
+    pool = WorkerPool(queue, concurrency=1, poll_interval=0.01).start()
+    try:
+        assert wait_for(lambda: queue.get(job_id)['status'] == 'failed')
+    finally:
+        pool.stop(timeout=1)
+    assert seen == [(1, 2), (2, 2)]
+    assert current_job() is None
+
+
+def test_renew_extends_only_the_current_attempt(queue):
+    job_id = queue.enqueue('noop', max_attempts=2)
+    claimed = queue.claim()
+    queue._conn().execute("UPDATE jobs SET lease_until = 0 WHERE id = ?", (job_id,))
+
+    assert queue.renew(claimed)
+    assert queue.get(job_id)['lease_until'] > time.time()
+
+    queue.fail(claimed, 'boom')
+    assert not queue.renew(claimed)
+
+
+def test_heartbeat_keeps_a_long_job_leased(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), lease_seconds=0.3)
+
+    @job('slow')
+    def slow():
+        time.sleep(1)
+        return 'finished'
+
+    job_id = queue.enqueue('slow', key='slow')
+    pool = WorkerPool(queue, concurrency=1, poll_interval=0.01).start()
+    try:
+        assert wait_for(lambda: queue.get(job_id)['status'] == 'running')
+        # A second claimer would expire the lease if the worker stopped renewing it
+        deadline = time.time() + 0.8
+        while time.time() < deadline:
+            assert queue.claim() is None
+            time.sleep(0.05)
+        assert wait_for(lambda: queue.get(job_id)['status'] == 'done')
+        assert queue.get(job_id)['attempts'] == 1
+    finally:
+        pool.stop(timeout=2)
+
+
+def test_latest_returns_most_recent_job_for_key(queue):
+    assert queue.latest('k') is None
+    first = queue.enqueue('noop', key='k', max_attempts=1)
+    queue.fail(queue.claim(), 'boom')
+    assert queue.latest('k')['id'] == first
+    assert queue.latest('k')['status'] == 'failed'
+
+    second = queue.enqueue('noop', key='k')
+    assert second != first
+    assert queue.latest('k')['id'] == second
+
+
+def test_prune_deletes_only_old_finished_jobs(queue):
+    done = queue.enqueue('noop')
+    queue.complete(queue.claim(), None)
+    pending = queue.enqueue('noop')
+    queue._conn().execute("UPDATE jobs SET updated_at = 0")
+
+    assert queue.prune(older_than=60) == 1
+    assert queue.get(done) is None
+    assert queue.get(pending)['status'] == 'queued'
+
+
+def test_ensure_started_starts_once_per_process(queue):
+    pool = WorkerPool(queue, concurrency=2, poll_interval=0.01)
+    try:
+        pool.ensure_started()
+        threads = list(pool._threads)
+        pool.ensure_started()
+        assert pool._threads == threads
+        assert len(threads) == 2
+    finally:
+        pool.stop(timeout=1)
@@ -0,0 +1,55 @@
+import io
+import os
+
+import pytest
+
+from materials import LocalBlobStore, extract_derivatives, ingest
+
+
+class FailingStream:
+    def __init__(self, data, fail_after):
+        self._stream = io.BytesIO(data)
+        self._fail_after = fail_after
+
+    def read(self, size):
+        if self._stream.tell() >= self._fail_after:
+            raise OSError("connection reset")
+        return self._stream.read(size)
+
+
+def test_ingest_deduplicates_identical_uploads(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    first = ingest(store, io.BytesIO(b'same pdf' * 1000), chunk_size=64)
+    second = ingest(store, io.BytesIO(b'same pdf' * 1000), chunk_size=64)
+
+    assert first[0] == second[0]
+    assert first[1] == second[1] == 8000
+    assert (first[2], second[2]) == (True, False)
+    assert os.listdir(store.staging_dir) == []
+
+
+def test_ingest_removes_staging_file_when_read_fails(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    with pytest.raises(OSError):
+        ingest(store, FailingStream(b'x' * 1000, fail_after=256), chunk_size=128)
+    assert os.listdir(store.staging_dir) == []
+
+
+def test_ingest_removes_staging_file_when_put_fails(tmp_path, monkeypatch):
+    store = LocalBlobStore(str(tmp_path))
+
+    def broken_put(key, path):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(store, 'put_file', broken_put)
+    with pytest.raises(OSError):
+        ingest(store, io.BytesIO(b'data'))
+    assert os.listdir(store.staging_dir) == []
+
+
+def test_legacy_binary_ppt_gets_no_derivatives(tmp_path):
+    # Without python-pptx the extraction would be skipped whatever the file
+    pytest.importorskip('pptx')
+    store = LocalBlobStore(str(tmp_path))
+    key, _, _ = ingest(store, io.BytesIO(b'\xd0\xcf\x11\xe0 legacy ppt'))
+    assert extract_derivatives(store, key, 'ppt') == {}
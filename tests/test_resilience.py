@@ -0,0 +1,162 @@
+import time
+
+import pytest
+
+from firestore_standin import FakeFirestore
+from resilience import (
+    BackendUnavailable, CircuitBreaker, CircuitOpenError, ResilientClient, StaleCache, serve_stale,
+)
+from tenancy import TenantRouter
+
+
+@pytest.fixture
+def fake():
+    return FakeFirestore()
+
+
+@pytest.fixture
+def db(fake):
+    return ResilientClient(
+        fake,
+        deadlines={'get': 0.05, 'stream': 0.05, 'set': 0.05, 'commit': 0.05},
+        breaker_factory=lambda: CircuitBreaker(failure_threshold=2, reset_seconds=0.1),
+    )
+
+
+def test_slow_read_hits_deadline(fake, db):
+    fake.inject('classrooms', latency=1)
+    started = time.monotonic()
+    with pytest.raises(BackendUnavailable):
+        db.collection('classrooms').document('c1').get()
+    assert time.monotonic() - started < 0.5
+
+
+def test_injected_error_is_reported_as_backend_unavailable(fake, db):
+    fake.inject('students', error=ConnectionError('quota exceeded'))
+    with pytest.raises(BackendUnavailable):
+        list(db.collection('students').where('usn', '==', 'u1').stream())
+
+
+def test_transient_error_is_retried_within_the_deadline(fake):
+    db = ResilientClient(fake, deadlines={'get': 1})
+    fake.collection('classrooms').document('c1').set({"status": "active"})
+    fake.inject('classrooms', error=ConnectionError('blip'), times=2)
+    fake.calls = 0
+
+    assert db.collection('classrooms').document('c1').get().to_dict() == {"status": "active"}
+    assert fake.calls == 3
+    assert db.breaker('classrooms').failures == 0
+
+
+def test_persistent_error_stops_at_the_deadline_not_the_sdk_retry(fake):
+    fake.sdk_retry_seconds = 2
+    db = ResilientClient(fake, deadlines={'get': 0.3})
+    fake.inject('classrooms', error=ConnectionError('down'))
+    fake.calls = 0
+
+    started = time.monotonic()
+    with pytest.raises(BackendUnavailable):
+        db.collection('classrooms').document('c1').get()
+    assert time.monotonic() - started < 0.6
+    assert fake.calls > 1
+    assert db.breaker('classrooms').failures == 1  # One failed call, however many attempts
+
+
+def test_adds_are_not_retried(fake):
+    db = ResilientClient(fake, deadlines={'add': 1})
+    fake.inject('quizzes', error=ConnectionError('blip'), times=1)
+    fake.calls = 0
+
+    with pytest.raises(BackendUnavailable):
+        db.collection('quizzes').add({"topic": "x"})
+    assert fake.calls == 1
+
+
+def test_breaker_opens_per_collection_after_threshold(fake, db):
+    fake.inject('classrooms', error=ConnectionError('down'))
+    for _ in range(2):
+        with pytest.raises(BackendUnavailable) as excinfo:
+            db.collection('classrooms').document('c1').get()
+        assert not isinstance(excinfo.value, CircuitOpenError)
+
+    with pytest.raises(CircuitOpenError):
+        db.collection('classrooms').document('c1').get()
+    # Other collections are unaffected
+    assert not db.collection('students').document('u1').get().exists
+
+
+def test_breaker_lets_one_half_open_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()       # The trial
+    assert not breaker.allow()   # Everyone else keeps failing fast meanwhile
+
+    breaker.record_failure()     # Failed trial reopens the circuit
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.allow()
+
+
+def test_breaker_closes_again_once_backend_recovers(fake, db):
+    fake.inject('classrooms', error=ConnectionError('down'))
+    for _ in range(3):
+        with pytest.raises(BackendUnavailable):
+            db.collection('classrooms').document('c1').get()
+
+    fake.clear_faults()
+    time.sleep(0.11)
+    assert not db.collection('classrooms').document('c1').get().exists
+    assert db.breaker('classrooms').state == 'closed'
+
+
+def test_collection_fault_fails_batched_dual_writes(fake, db):
+    router = TenantRouter(db, mode='dual')
+    fake.inject('classrooms', error=ConnectionError('down'))
+    with pytest.raises(BackendUnavailable):
+        router.document('classrooms', 'c1', 'abc').set({"college_name": "ABC"})
+
+    fake.clear_faults()
+    router.document('classrooms', 'c1', 'abc').set({"college_name": "ABC"})
+    assert fake.collection('classrooms').document('c1').get().exists
+    assert router.get('classrooms', 'c1', 'abc').to_dict() == {"college_name": "ABC"}
+
+
+def test_serve_stale_replays_last_good_response(fake, db):
+    flask = pytest.importorskip('flask')
+    app = flask.Flask(__name__)
+    cache = StaleCache()
+
+    @app.errorhandler(BackendUnavailable)
+    def backend_unavailable(e):
+        return flask.jsonify({"error": str(e)}), 503
+
+    @app.route('/notes/<classroom_id>')
+    @serve_stale(cache)
+    def notes(classroom_id):
+        docs = db.collection('notes').where('classroom_id', '==', classroom_id).stream()
+        return flask.jsonify([doc.to_dict() for doc in docs]), 200
+
+    fake.collection('notes').document('n1').set({"classroom_id": "c1", "title": "Week 1"})
+    client = app.test_client()
+
+    fresh = client.get('/notes/c1')
+    assert fresh.status_code == 200
+    assert 'X-Stale' not in fresh.headers
+
+    fake.inject('notes', error=ConnectionError('down'))
+    stale = client.get('/notes/c1')
+    assert stale.status_code == 200
+    assert stale.headers['X-Stale'] == 'true'
+    assert stale.headers['Warning'].startswith('110')
+    assert stale.get_json() == fresh.get_json()
+
+    # Nothing cached for this classroom yet
+    assert client.get('/notes/c2').status_code == 503
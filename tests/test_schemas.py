@@ -0,0 +1,73 @@
+import pytest
+
+pytest.importorskip('pydantic')
+
+from firestore_standin import FakeFirestore
+from schemas import AddMarks, Attendance, JsonDocument, StudentSignup, parse_request, validate_body
+
+
+def error_types(errors):
+    return {error['type'] for error in errors}
+
+
+def test_missing_body_is_rejected():
+    body, errors = validate_body(StudentSignup, b'')
+    assert body is None
+    assert error_types(errors) == {'json_invalid'}
+
+
+def test_malformed_json_is_rejected():
+    _, errors = validate_body(StudentSignup, b'{"usn": "1AB21CS001",')
+    assert error_types(errors) == {'json_invalid'}
+
+
+def test_empty_string_field_is_rejected():
+    _, errors = validate_body(StudentSignup, b'{"usn": "  ", "name": "Asha", "email": "asha@example.com"}')
+    assert [error['loc'] for error in errors] == [('usn',)]
+
+
+def test_null_usns_is_rejected():
+    _, errors = validate_body(Attendance, b'{"usns": null}')
+    assert [error['loc'] for error in errors] == [('usns',)]
+
+
+def test_non_int_marks_are_rejected():
+    _, errors = validate_body(AddMarks, b'{"classroom_id": "cs101", "usn": "u1", "marks": {"test1": "eighty"}}')
+    assert [error['loc'] for error in errors] == [('marks', 'test1')]
+
+
+def test_valid_body_is_decoded():
+    body, errors = validate_body(AddMarks, b'{"classroom_id": "cs101", "usn": "u1", "marks": {"test1": 85}}')
+    assert errors is None
+    assert body.marks == {"test1": 85}
+
+
+def test_free_form_documents_must_be_non_empty_objects():
+    assert validate_body(JsonDocument, b'{"name": "x", "tags": [1]}')[0].model_dump() == {"name": "x", "tags": [1]}
+    assert validate_body(JsonDocument, b'{}')[1]
+    assert validate_body(JsonDocument, b'[1, 2]')[1]
+
+
+@pytest.mark.parametrize('payload', [
+    None,
+    b'not json',
+    b'{"usns": null}',
+    b'{"usns": ["u1", ""]}',
+])
+def test_bad_attendance_is_rejected_before_any_db_call(payload):
+    flask = pytest.importorskip('flask')
+    app = flask.Flask(__name__)
+    fake = FakeFirestore()
+
+    @app.route('/attendance/<classroom_id>', methods=['POST'])
+    def take_attendance(classroom_id):
+        data, error = parse_request(Attendance, "A list of USNs is required.")
+        if error:
+            return error
+        fake.collection('attendance').document().set({"classroom_id": classroom_id, "present_students": data.usns})
+        return flask.jsonify({"success": True}), 201
+
+    response = app.test_client().post('/attendance/cs101', data=payload, content_type='application/json')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == "A list of USNs is required."
+    assert fake._data == {}
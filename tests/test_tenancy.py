@@ -0,0 +1,119 @@
+import pytest
+
+import migrate_tenants
+from firestore_standin import FakeFirestore
+from tenancy import TENANT_INDEX, TenantRequired, TenantRouter
+
+
+@pytest.fixture
+def fake():
+    return FakeFirestore()
+
+
+def seed(fake, collection, doc_id, data):
+    fake.collection(collection).document(doc_id).set(data)
+
+
+def tenant_doc(fake, tenant, collection, doc_id):
+    return fake.collection('colleges').document(tenant).collection(collection).document(doc_id).get()
+
+
+def test_students_are_attributed_through_attendance_and_performance(fake):
+    seed(fake, 'classrooms', 'c1', {"college_name": "ABC College", "teacher_code": "t1"})
+    seed(fake, 'classrooms', 'c2', {"college_name": "XYZ"})
+    seed(fake, 'attendance', 'a1', {"classroom_id": "c1", "present_students": ["u1"]})
+    seed(fake, 'student_performance', 'p1', {"classroom_id": "c2", "usn": "u2"})
+    for usn in ('u1', 'u2'):
+        seed(fake, 'students', usn, {"name": usn})
+    seed(fake, 'teachers', 't1', {"name": "T"})
+
+    assert migrate_tenants.main(['--workers', '2'], db=fake) == 0
+
+    assert tenant_doc(fake, 'abc_college', 'students', 'u1').to_dict() == {"name": "u1"}
+    assert tenant_doc(fake, 'xyz', 'students', 'u2').exists
+    assert not tenant_doc(fake, 'xyz', 'students', 'u1').exists
+    assert tenant_doc(fake, 'abc_college', 'attendance', 'a1').exists
+    assert tenant_doc(fake, 'abc_college', 'teachers', 't1').exists
+    assert fake.collection(TENANT_INDEX).document('c2').get().to_dict() == {"tenant": "xyz"}
+
+
+def test_existing_tenant_copies_are_never_overwritten(fake):
+    seed(fake, 'classrooms', 'c1', {"college_name": "ABC", "students": ["u1", "u2"]})
+    seed(fake, 'students', 'u1', {"name": "old"})
+    seed(fake, 'students', 'u2', {"name": "new student"})
+    # Written by dual-mode traffic after the flat copy was last touched
+    fake.collection('colleges').document('abc').collection('students').document('u1').set({"name": "newer"})
+
+    assert migrate_tenants.main([], db=fake) == 0
+
+    assert tenant_doc(fake, 'abc', 'students', 'u1').to_dict() == {"name": "newer"}
+    assert tenant_doc(fake, 'abc', 'students', 'u2').to_dict() == {"name": "new student"}
+
+
+def test_stranded_students_block_cutover(fake, capsys):
+    seed(fake, 'classrooms', 'c1', {"college_name": "ABC", "students": ["u1"]})
+    seed(fake, 'students', 'u1', {"name": "placed"})
+    seed(fake, 'students', 'u9', {"name": "orphan"})
+
+    assert migrate_tenants.main([], db=fake) == 1
+    assert "BLOCKING: 1 students cannot be attributed to a college: u9" in capsys.readouterr().out
+
+
+def test_dry_run_writes_nothing(fake):
+    seed(fake, 'classrooms', 'c1', {"college_name": "ABC"})
+    assert migrate_tenants.main(['--dry-run'], db=fake) == 0
+    assert 'colleges/abc/classrooms' not in fake._data
+    assert TENANT_INDEX not in fake._data
+
+
+def test_tenant_mode_refuses_unscoped_lookups(fake):
+    router = TenantRouter(fake, mode='tenant')
+    seed(fake, 'classrooms', 'c1', {"college_name": "ABC"})
+
+    assert router.tenant_for_classroom('c1') is None
+    with pytest.raises(TenantRequired):
+        router.get('classrooms', 'c1', None)
+    with pytest.raises(TenantRequired):
+        router.document('attendance')
+    # Collections that are not per college stay reachable
+    assert not router.get('notes', 'n1', None).exists
+
+
+class CountingDocument:
+    def __init__(self, ref, calls):
+        self._ref = ref
+        self._calls = calls
+        self.id = ref.id
+
+    def __getattr__(self, name):
+        self._calls.append(name)
+        return getattr(self._ref, name)
+
+
+def test_single_layout_update_does_not_read_first(fake):
+    router = TenantRouter(fake, mode='legacy')
+    seed(fake, 'classrooms', 'c1', {"status": "pending"})
+    document = router.document('classrooms', 'c1')
+    calls = []
+    document._refs = [CountingDocument(document._refs[0], calls)]
+
+    document.update({"status": "confirmed"})
+    assert calls == ['update']
+    assert fake.collection('classrooms').document('c1').get().to_dict() == {"status": "confirmed"}
+
+
+def test_dual_update_copies_the_whole_document(fake):
+    router = TenantRouter(fake, mode='dual')
+    seed(fake, 'classrooms', 'c1', {"status": "pending", "subject": "Maths"})
+
+    router.document('classrooms', 'c1', 'abc').update({"status": "confirmed"})
+    expected = {"status": "confirmed", "subject": "Maths"}
+    assert tenant_doc(fake, 'abc', 'classrooms', 'c1').to_dict() == expected
+    assert fake.collection('classrooms').document('c1').get().to_dict() == expected
+
+
+def test_dual_update_of_missing_document_writes_nothing(fake):
+    router = TenantRouter(fake, mode='dual')
+    with pytest.raises(LookupError):
+        router.document('classrooms', 'c1', 'abc').update({"status": "confirmed"})
+    assert not tenant_doc(fake, 'abc', 'classrooms', 'c1').exists